@@ -0,0 +1,381 @@
+import pygame
+import random
+from collections import deque
+from functools import cache
+from heapq import heappush, heappop
+from game_engine import *
+
+
+UNREACHABLE = 1 << 30
+MAX_FIELD_UPDATES = 300
+MAX_ROOM_SEARCH = 600
+
+
+def get_neighbors(index, board_x, board_y):
+    x, y = index % board_x, index // board_x
+    sides = ((index - 1, x > 0), (index + 1, x < board_x - 1), (index - board_x, y > 0), (index + board_x, y < board_y - 1))
+    return tuple(neighbor for neighbor, inside in sides if inside)
+
+
+@cache
+def get_blocked_table(deadly_cells):
+    return bytes(cell in deadly_cells for cell in range(256))
+
+
+@cache
+def get_neighbor_table(board_x, board_y):
+    # worked out once per board size, searches only look the neighbours up
+    return [get_neighbors(index, board_x, board_y) for index in range(board_x * board_y)]
+
+
+
+class NeighborLookup:
+    # chunked boards are too big for a table, their neighbours are worked out on demand
+
+    def __init__(self, board_x, board_y):
+        self.board_x, self.board_y = board_x, board_y
+
+
+    def __getitem__(self, index):
+        return get_neighbors(index, self.board_x, self.board_y)
+
+
+
+class BlockedLookup:
+    # chunked boards have no flat cell view to translate, their cells are looked up one at a time
+
+    def __init__(self, get_cell, board_x, deadly):
+        self.get_cell, self.board_x, self.deadly = get_cell, board_x, deadly
+
+
+    def __getitem__(self, index):
+        return self.deadly[self.get_cell((index % self.board_x, index // self.board_x))]
+
+
+
+class DistanceMap(dict):
+    # a sparse field for chunked boards, cells never reached are unreachable
+
+    def __missing__(self, index):
+        return UNREACHABLE
+
+
+
+class Agent:
+    NAME = "Agent"
+    HUMAN = False
+
+    def reset(self, seed=None):
+        pass
+
+
+    def handle_event(self, event):
+        pass
+
+
+    def is_fast_forward(self, direction):
+        return False
+
+
+    def is_finished(self, ticks):
+        return False
+
+
+    def get_action(self, observation):
+        return observation.head_direction
+
+
+
+class KeyboardAgent(Agent):
+    NAME = "Keyboard"
+    HUMAN = True
+    TURN_QUEUE_SIZE = 3
+
+    def reset(self, seed=None):
+        self.last_turn = START_DIRECTION
+        self.turns = deque()
+
+
+    def is_turn(self, direction, current_direction):
+        return direction != current_direction and direction != OPPOSITES[current_direction]
+
+
+    def handle_event(self, event):
+        if event.type != pygame.KEYDOWN or event.key not in VALID_KEYS:
+            return
+
+        # each queued turn has to make sense after the one queued before it
+        if len(self.turns) < self.TURN_QUEUE_SIZE and self.is_turn(event.key, self.last_turn):
+            self.turns.append(event.key)
+            self.last_turn = event.key
+
+
+    def is_fast_forward(self, direction):
+        return not self.turns and pygame.key.get_pressed()[direction]
+
+
+    def get_action(self, observation):
+        # one turn per tick, checked against the direction the snake actually moves in
+        while self.turns:
+            direction = self.turns.popleft()
+            if self.is_turn(direction, observation.head_direction):
+                return direction
+
+        self.last_turn = observation.head_direction
+        return observation.head_direction
+
+
+
+class RandomAgent(Agent):
+    NAME = "Random"
+
+    def reset(self, seed=None):
+        self.random = random.Random(seed)
+
+
+    def get_action(self, observation):
+        if self.random.random() >= HEADLESS_TURN_CHANCE:
+            return observation.head_direction
+
+        return self.random.choice([key for key in VALID_KEYS if key != OPPOSITES[observation.head_direction]])
+
+
+
+class GreedyAgent(Agent):
+    NAME = "Greedy"
+
+    def get_safe_moves(self, observation):
+        head_x, head_y = observation.snake_head
+        safe_moves = {}
+
+        for key in VALID_KEYS:
+            if key == OPPOSITES[observation.head_direction]:
+                continue
+
+            step_x, step_y = DIRECTION_STEPS[key]
+            next_location = (head_x + step_x, head_y + step_y)
+
+            if not observation.is_deadly(next_location) or next_location == observation.snake_tail:
+                safe_moves[key] = next_location
+
+        return safe_moves
+
+
+    def get_action(self, observation):
+        safe_moves = self.get_safe_moves(observation)
+
+        if not safe_moves or not observation.apple_location:
+            return observation.head_direction
+
+        apple_x, apple_y = observation.apple_location
+        return min(safe_moves, key=lambda key: abs(safe_moves[key][0] - apple_x) + abs(safe_moves[key][1] - apple_y))
+
+
+
+class AutopilotAgent(GreedyAgent):
+    NAME = "Autopilot"
+
+    def reset(self, seed=None):
+        self.board_size = None
+        self.neighbors = None
+        self.goal = None
+        self.last_tick = None
+        self.last_tail = None
+
+
+    def to_index(self, location):
+        return location[1] * self.board_x + location[0]
+
+
+    def set_board(self, observation):
+        self.board_size = (observation.board_x, observation.board_y)
+        self.board_x = observation.board_x
+        self.goal = None
+        if observation.cells is None:
+            self.neighbors = NeighborLookup(*self.board_size)
+        else:
+            self.neighbors = get_neighbor_table(*self.board_size)
+
+
+    def get_blocked_cells(self, observation):
+        deadly = get_blocked_table(frozenset(observation.deadly_cells))
+
+        if observation.cells is None:
+            return BlockedLookup(observation.get_cell, self.board_x, deadly)
+
+        return observation.cells.tobytes().translate(deadly)
+
+
+    def get_distance(self, index, location):
+        return abs(index % self.board_x - location[0]) + abs(index // self.board_x - location[1])
+
+
+    def get_key(self, index):
+        distance = min(self.distances[index], self.lookahead[index])
+        start_x, start_y = self.start
+        return (distance + abs(index % self.board_x - start_x) + abs(index // self.board_x - start_y) + self.key_offset, distance)
+
+
+    def update_cell(self, index):
+        distances, lookahead, blocked = self.distances, self.lookahead, self.blocked
+
+        if index != self.goal:
+            distance = UNREACHABLE
+
+            # nothing leads through a blocked cell, only the head itself gets a distance
+            if not blocked[index] or index == self.start_index:
+                for neighbor in self.neighbors[index]:
+                    if distances[neighbor] < distance and not blocked[neighbor]:
+                        distance = distances[neighbor]
+
+            lookahead[index] = min(distance + 1, UNREACHABLE)
+
+        if distances[index] == lookahead[index]:
+            self.queued.pop(index, None)
+        else:
+            key = self.get_key(index)
+            self.queued[index] = key
+            heappush(self.heap, (key, index))
+
+
+    def get_field(self):
+        if isinstance(self.neighbors, NeighborLookup):
+            return DistanceMap()
+
+        return [UNREACHABLE] * (self.board_size[0] * self.board_size[1])
+
+
+    def reset_field(self, observation):
+        # walls and poison only move together with the apple, so a new apple is the only full restart
+        self.goal = self.to_index(observation.apple_location)
+        self.start = observation.snake_head
+        self.start_index = self.to_index(self.start)
+        self.key_offset = 0
+        self.distances = self.get_field()
+        self.lookahead = self.get_field()
+        self.lookahead[self.goal] = 0
+        self.queued = {}
+        self.heap = []
+        self.update_cell(self.goal)
+
+
+    def move_start(self, observation):
+        # from one tick to the next only the head and the tail cells change
+        last_start = self.start_index
+        self.start = observation.snake_head
+        self.start_index = self.to_index(self.start)
+        self.key_offset += self.get_distance(last_start, self.start)
+
+        for index in (self.start_index, *self.neighbors[self.start_index], last_start):
+            self.update_cell(index)
+
+        last_tail = self.to_index(self.last_tail)
+        if self.last_tail != observation.snake_tail and not self.blocked[last_tail]:
+            for index in (last_tail, *self.neighbors[last_tail]):
+                self.update_cell(index)
+
+
+    def update_field(self):
+        # D* Lite: cells are only settled until the head's distance is known, and never more than the budget per tick
+        for _ in range(MAX_FIELD_UPDATES):
+            while self.heap and self.queued.get(self.heap[0][1]) != self.heap[0][0]:
+                heappop(self.heap)
+
+            if not self.heap:
+                return True
+
+            key, index = self.heap[0]
+            if key >= self.get_key(self.start_index) and self.distances[self.start_index] == self.lookahead[self.start_index]:
+                return True
+
+            heappop(self.heap)
+            new_key = self.get_key(index)
+
+            if key < new_key:
+                self.queued[index] = new_key
+                heappush(self.heap, (new_key, index))
+            elif self.distances[index] > self.lookahead[index]:
+                self.distances[index] = self.lookahead[index]
+                del self.queued[index]
+                for neighbor in self.neighbors[index]:
+                    self.update_cell(neighbor)
+            else:
+                self.distances[index] = UNREACHABLE
+                for neighbor in (index, *self.neighbors[index]):
+                    self.update_cell(neighbor)
+
+        # the rest of the work carries over to the next tick
+        return False
+
+
+    def get_room(self, location, observation):
+        start, tail = self.to_index(location), self.to_index(observation.snake_tail)
+        needed_room = min(observation.snake_length, MAX_ROOM_SEARCH)
+        neighbors, blocked = self.neighbors, self.blocked
+        visited = {start}
+        queue = deque([start])
+
+        # enough room once the tail is in reach or the area outgrows the snake
+        while queue and len(visited) <= needed_room:
+            for neighbor in neighbors[queue.popleft()]:
+                if neighbor == tail:
+                    return UNREACHABLE
+                if not blocked[neighbor] and neighbor not in visited:
+                    visited.add(neighbor)
+                    queue.append(neighbor)
+
+        return len(visited)
+
+
+    def has_room(self, room, observation):
+        return room > min(observation.snake_length, MAX_ROOM_SEARCH)
+
+
+    def get_apple_moves(self, observation, safe_moves):
+        if self.goal != self.to_index(observation.apple_location) or observation.ticks != self.last_tick + 1:
+            self.reset_field(observation)
+        else:
+            self.move_start(observation)
+
+        self.last_tick = observation.ticks
+        self.last_tail = observation.snake_tail
+        complete = self.update_field()
+        distances = {}
+        for key, location in safe_moves.items():
+            index = self.to_index(location)
+            distances[key] = UNREACHABLE if self.blocked[index] else self.distances[index]
+
+        # while the field is unfinished, heading straight for the apple breaks the ties
+        apple_x, apple_y = observation.apple_location
+        apple_moves = sorted(safe_moves, key=lambda key: (distances[key], abs(safe_moves[key][0] - apple_x) + abs(safe_moves[key][1] - apple_y)))
+
+        return [key for key in apple_moves if not complete or distances[key] < UNREACHABLE]
+
+
+    def get_action(self, observation):
+        if self.board_size != (observation.board_x, observation.board_y):
+            self.set_board(observation)
+
+        self.blocked = self.get_blocked_cells(observation)
+        safe_moves = self.get_safe_moves(observation)
+        rooms = {}
+
+        if observation.apple_location:
+            for key in self.get_apple_moves(observation, safe_moves):
+                rooms[key] = self.get_room(safe_moves[key], observation)
+                if self.has_room(rooms[key], observation):
+                    return key
+
+        # no safe way to the apple, stay alive by heading where the tail can be reached
+        for key in safe_moves:
+            if key not in rooms:
+                rooms[key] = self.get_room(safe_moves[key], observation)
+
+        if not rooms:
+            return observation.head_direction
+
+        return max(rooms, key=lambda key: (rooms[key], key == observation.head_direction))
+
+
+
+AGENTS = {agent.NAME: agent for agent in (RandomAgent, GreedyAgent, AutopilotAgent)}
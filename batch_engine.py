@@ -0,0 +1,219 @@
+import numpy as np
+from game_engine import *
+
+
+ACTION_STEPS = np.array([DIRECTION_STEPS[key] for key in VALID_KEYS], dtype=np.int64)
+OPPOSITE_ACTIONS = np.array([VALID_KEYS.index(OPPOSITES[key]) for key in VALID_KEYS])
+START_ACTION = VALID_KEYS.index(START_DIRECTION)
+KEEP_DIRECTION = -1
+
+
+class BatchEngine:
+
+    def __init__(self, mode, num_games, board_size=DEFAULT_BOARD_SIZE, seed=None):
+        self.mode = mode
+        self.num_games = num_games
+        self.board_x, self.board_y = board_size
+        self.board_cells = self.board_x * self.board_y
+        self.random = np.random.default_rng(seed)
+
+        deadly_cells = GAME_ENGINES[mode].DEADLY_CELLS
+        self.has_walls = WALL_CELL in deadly_cells
+        self.has_poison = POISON_CELL in deadly_cells
+        self.deadly_lookup = np.zeros(256, dtype=bool)
+        self.deadly_lookup[list(deadly_cells - {OUT_OF_BOUNDS})] = True
+
+        self.game_ids = np.arange(num_games)
+        self.grid = np.zeros((num_games, self.board_cells), dtype=np.uint8)
+        self.body = np.zeros((num_games, self.board_cells), dtype=np.int32)
+        self.head_index = np.zeros(num_games, dtype=np.int64)
+        self.length = np.zeros(num_games, dtype=np.int64)
+        self.heads = np.zeros((num_games, 2), dtype=np.int64)
+        self.directions = np.zeros(num_games, dtype=np.int64)
+        self.apples = np.zeros(num_games, dtype=np.int64)
+        self.walls = np.full((num_games, WALL_LENGTH * DEFAULT_WALLS), -1, dtype=np.int64)
+        self.poisoned_apples = np.full((num_games, DEFAULT_POISONED_APPLES), -1, dtype=np.int64)
+        self.board_full = np.zeros(num_games, dtype=bool)
+
+        self.picked_apples = np.zeros(num_games, dtype=np.int64)
+        self.scores = np.zeros(num_games, dtype=np.int64)
+        self.ticks = np.zeros(num_games, dtype=np.int64)
+        self.play_time = np.zeros(num_games, dtype=np.float64)
+
+        self.final_scores = np.zeros(num_games, dtype=np.int64)
+        self.final_ticks = np.zeros(num_games, dtype=np.int64)
+        self.final_play_time = np.zeros(num_games, dtype=np.float64)
+        self.final_board_full = np.zeros(num_games, dtype=bool)
+
+        self.reset_games(self.game_ids)
+
+
+    def reset_games(self, games):
+        head_x, head_y = DEFAULT_SNAKE_HEAD
+        start_body = head_y * self.board_x + head_x - np.arange(DEFAULT_SNAKE_LENGTH)[::-1]
+
+        self.grid[games] = EMPTY_CELL
+        self.body[games, :DEFAULT_SNAKE_LENGTH] = start_body
+        self.grid[games[:, None], start_body[None, :]] = BODY_CELL
+        self.head_index[games] = DEFAULT_SNAKE_LENGTH - 1
+        self.length[games] = DEFAULT_SNAKE_LENGTH
+        self.heads[games] = DEFAULT_SNAKE_HEAD
+        self.directions[games] = START_ACTION
+        self.walls[games] = -1
+        self.poisoned_apples[games] = -1
+        self.board_full[games] = False
+
+        self.picked_apples[games] = 0
+        self.scores[games] = 0
+        self.ticks[games] = 0
+        self.play_time[games] = 0
+
+        self.spawn_items(games)
+
+
+    def sample_cells(self, valid_cells):
+        weights = self.random.random(valid_cells.shape)
+        weights[~valid_cells] = -1
+        cells = weights.argmax(axis=1)
+        return cells, weights[np.arange(len(cells)), cells] >= 0
+
+
+    def clear_cells(self, games, cells, cell_type):
+        games = np.broadcast_to(games[:, None], cells.shape)
+        placed = cells >= 0
+        placed[placed] = self.grid[games[placed], cells[placed]] == cell_type
+        self.grid[games[placed], cells[placed]] = EMPTY_CELL
+
+
+    def get_wall_starts(self, games):
+        free = (self.grid[games] == EMPTY_CELL).reshape(len(games), self.board_y, self.board_x)
+        wall_starts = []
+
+        for axis, limit in ((2, self.board_x), (1, self.board_y)):
+            fits = np.zeros(free.shape, dtype=bool)
+
+            if limit >= WALL_LENGTH:
+                free_sums = np.cumsum(free, axis=axis, dtype=np.int32)
+                free_sums = np.concatenate([np.zeros_like(free_sums.take([0], axis=axis)), free_sums], axis=axis)
+                run_sums = free_sums.take(range(WALL_LENGTH, limit + 1), axis=axis) - free_sums.take(range(limit - WALL_LENGTH + 1), axis=axis)
+                fits_view = fits[:, :, :limit - WALL_LENGTH + 1] if axis == 2 else fits[:, :limit - WALL_LENGTH + 1, :]
+                fits_view[...] = run_sums == WALL_LENGTH
+
+            wall_starts.append(fits.reshape(len(games), self.board_cells))
+
+        return wall_starts
+
+
+    def set_new_walls(self, games):
+        self.clear_cells(games, self.walls[games], WALL_CELL)
+        self.walls[games] = -1
+
+        for wall in range(DEFAULT_WALLS):
+            horizontal_starts, vertical_starts = self.get_wall_starts(games)
+            horizontal, found_horizontal = self.sample_cells(horizontal_starts)
+            vertical, found_vertical = self.sample_cells(vertical_starts)
+
+            # try a random direction first and fall back to the other one
+            use_vertical = self.random.random(len(games)) < 0.5
+            use_vertical = (use_vertical & found_vertical) | ~found_horizontal
+            found = np.where(use_vertical, found_vertical, found_horizontal)
+            starts = np.where(use_vertical, vertical, horizontal)
+            steps = np.where(use_vertical, self.board_x, 1)
+
+            wall_cells = starts[:, None] + steps[:, None] * np.arange(WALL_LENGTH)[None, :]
+            wall_cells[~found] = -1
+            self.walls[games, wall * WALL_LENGTH:(wall + 1) * WALL_LENGTH] = wall_cells
+
+            placed = games[found]
+            self.grid[placed[:, None], wall_cells[found]] = WALL_CELL
+
+
+    def set_poisoned_apples(self, games):
+        self.clear_cells(games, self.poisoned_apples[games], POISON_CELL)
+
+        for i in range(DEFAULT_POISONED_APPLES):
+            cells, found = self.sample_cells(self.grid[games] == EMPTY_CELL)
+            self.poisoned_apples[games, i] = np.where(found, cells, -1)
+            self.grid[games[found], cells[found]] = POISON_CELL
+
+
+    def spawn_items(self, games):
+        cells, found = self.sample_cells(self.grid[games] == EMPTY_CELL)
+        self.apples[games] = cells
+        self.grid[games[found], cells[found]] = APPLE_CELL
+        self.board_full[games[~found]] = True
+
+        if self.has_walls:
+            self.set_new_walls(games[found])
+        if self.has_poison:
+            self.set_poisoned_apples(games[found])
+
+
+    def step(self, actions=None):
+        games = self.game_ids
+
+        if actions is not None:
+            actions = np.asarray(actions)
+            turning = (actions >= 0) & (actions != OPPOSITE_ACTIONS[self.directions])
+            self.directions = np.where(turning, actions, self.directions)
+
+        self.play_time += 1 / (DEFAULT_SNAKE_SPEED + (self.picked_apples // APPLE_SPEED_UP_INTERVAL))
+        self.ticks += 1
+
+        self.heads += ACTION_STEPS[self.directions]
+        head_x, head_y = self.heads[:, 0], self.heads[:, 1]
+        out_of_bounds = (head_x < 0) | (head_x >= self.board_x) | (head_y < 0) | (head_y >= self.board_y)
+        head_cells = np.where(out_of_bounds, 0, head_y * self.board_x + head_x)
+
+        eaten = (self.grid[games, head_cells] == APPLE_CELL) & ~out_of_bounds
+
+        # the tail moves out before the head moves in, like the single game engine
+        moving = ~eaten
+        tails = self.body[games, (self.head_index - self.length + 1) % self.board_cells]
+        self.grid[games[moving], tails[moving]] = EMPTY_CELL
+
+        dead = out_of_bounds | self.deadly_lookup[self.grid[games, head_cells]]
+        alive = ~dead
+
+        self.head_index = (self.head_index + 1) % self.board_cells
+        self.body[games, self.head_index] = head_cells
+        self.grid[games[alive], head_cells[alive]] = BODY_CELL
+        self.length += eaten
+
+        rewards = eaten * SCORE_INTERVAL
+        self.picked_apples += eaten
+        self.scores += rewards
+
+        respawn = np.flatnonzero(eaten & alive)
+        if respawn.size:
+            self.spawn_items(respawn)
+
+        dones = dead | self.board_full
+        finished = np.flatnonzero(dones)
+        if finished.size:
+            self.final_scores[finished] = self.scores[finished]
+            self.final_ticks[finished] = self.ticks[finished]
+            self.final_play_time[finished] = self.play_time[finished]
+            self.final_board_full[finished] = self.board_full[finished]
+            self.reset_games(finished)
+
+        return rewards, dones
+
+
+    def get_random_actions(self):
+        turning = self.random.random(self.num_games) < HEADLESS_TURN_CHANCE
+        return np.where(turning, self.random.integers(0, len(VALID_KEYS), self.num_games), KEEP_DIRECTION)
+
+
+
+def run_batch_games(mode, games, batch_size, seed=None, board_size=DEFAULT_BOARD_SIZE):
+    engine = BatchEngine(mode, min(games, batch_size), board_size, seed)
+    results = []
+
+    while len(results) < games:
+        _, dones = engine.step(engine.get_random_actions())
+
+        for game in np.flatnonzero(dones):
+            results.append((mode, int(engine.final_scores[game]), float(engine.final_play_time[game]), None))
+
+    return results[:games]
@@ -0,0 +1,299 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import pygame
+from game_engine import *
+from agents import GreedyAgent
+
+
+BENCHMARK_SUITES = ["logic", "render", "db"]
+BENCHMARK_MIN_TIME = 0.2
+BENCHMARK_REPEATS = 3
+SNAKE_LENGTHS = [4, 30, 300, 3000]
+FILL_LEVELS = [0, 0.25, 0.5, 0.75, 0.95]
+LONG_SNAKE_BOARD = (72, 44)
+TICK_BENCHMARK_TICKS = 20000
+RENDER_FRAMES = 2000
+DB_ROW_COUNTS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_MAX_ROWS = 10 ** 5
+STEP_KEYS = {step: key for key, step in DIRECTION_STEPS.items()}
+
+
+def time_calls(func, min_time=BENCHMARK_MIN_TIME, repeats=BENCHMARK_REPEATS):
+    best = None
+
+    for _ in range(repeats):
+        calls, batch, elapsed = 0, 1, 0
+
+        # double the batch until a single timing covers min_time
+        while elapsed < min_time:
+            start = time.perf_counter()
+            for _ in range(batch):
+                func()
+            elapsed += time.perf_counter() - start
+            calls += batch
+            batch *= 2
+
+        if best is None or elapsed / calls < best[1] / best[0]:
+            best = (calls, elapsed)
+
+    return best
+
+
+def get_result(suite, case, params, calls, seconds):
+    return {
+        "suite": suite,
+        "case": case,
+        "params": params,
+        "calls": calls,
+        "seconds": seconds,
+        "per_call_us": seconds / calls * 1e6,
+        "calls_per_s": calls / seconds,
+    }
+
+
+def benchmark_calls(suite, case, params, func):
+    return get_result(suite, case, params, *time_calls(func))
+
+
+def get_board_cycle(board_size):
+    # a closed serpentine path through every cell, so a snake following it never dies
+    board_x, board_y = board_size
+    cycle = [(x, 0) for x in range(board_x)]
+
+    for y in range(1, board_y):
+        columns = range(board_x - 1, 0, -1) if y % 2 else range(1, board_x)
+        cycle.extend((x, y) for x in columns)
+
+    cycle.extend((0, y) for y in range(board_y - 1, 0, -1))
+    return cycle
+
+
+def set_cycle_snake(engine, cycle, length):
+    engine.reset()
+    engine.grid.reset()
+    engine.snake_body = deque(cycle[length - 1 - i] for i in range(length))
+    engine.snake_head = list(engine.snake_body[0])
+    engine.head_direction = STEP_KEYS[(cycle[length - 1][0] - cycle[length - 2][0], cycle[length - 1][1] - cycle[length - 2][1])]
+    engine.grid.set_many(engine.snake_body, BODY_CELL)
+
+    # no apple, so the snake keeps its length while it goes round
+    engine.apple_location = ()
+    engine.apple_spawned = True
+
+
+def fill_board(engine, fill_level, rng):
+    engine.reset()
+    cells = engine.board_x * engine.board_y
+    engine.grid.set_many((engine.grid.to_location(i) for i in rng.sample(range(cells), int(cells * fill_level))), BODY_CELL)
+
+
+def benchmark_snake_lengths():
+    results = []
+    cycle = get_board_cycle(LONG_SNAKE_BOARD)
+    engine = StandardEngine(LONG_SNAKE_BOARD, 0)
+    probe = [(x, LONG_SNAKE_BOARD[1] // 2) for x in range(WALL_LENGTH)]
+
+    for length in SNAKE_LENGTHS:
+        set_cycle_snake(engine, cycle, length)
+        position = [length]
+
+        def update_body():
+            engine.snake_head[0], engine.snake_head[1] = cycle[position[0] % len(cycle)]
+            engine.update_snake_body()
+            position[0] += 1
+
+        def step():
+            next_x, next_y = cycle[position[0] % len(cycle)]
+            engine.step(STEP_KEYS[(next_x - engine.snake_head[0], next_y - engine.snake_head[1])])
+            position[0] += 1
+
+        params = {"snake_length": length, "board_size": LONG_SNAKE_BOARD}
+        results.append(benchmark_calls("logic", "update_snake_body", params, update_body))
+
+        set_cycle_snake(engine, cycle, length)
+        position[0] = length
+        results.append(benchmark_calls("logic", "step", params, step))
+        results.append(benchmark_calls("logic", "validate_snake_in_bounds", params, engine.validate_snake_in_bounds))
+        results.append(benchmark_calls("logic", "location_is_occupied", {**params, "locations": len(probe)}, lambda: engine.location_is_occupied(probe)))
+
+    return results
+
+
+def benchmark_fill_levels():
+    results = []
+    rng = random.Random(0)
+    engine = WallsEngine(DEFAULT_BOARD_SIZE, 0)
+
+    for fill_level in FILL_LEVELS:
+        fill_board(engine, fill_level, rng)
+        params = {"fill_level": fill_level, "board_size": DEFAULT_BOARD_SIZE}
+        results.append(benchmark_calls("logic", "get_new_location", params, engine.get_new_location))
+        results.append(benchmark_calls("logic", "set_new_wall", params, engine.set_new_wall))
+
+    return results
+
+
+def benchmark_tick_rates(ticks=TICK_BENCHMARK_TICKS):
+    results = []
+
+    for mode, engine_class in GAME_ENGINES.items():
+        engine = engine_class(DEFAULT_BOARD_SIZE, 0)
+        agent = GreedyAgent()
+        agent.reset(0)
+        start = time.perf_counter()
+
+        for tick in range(ticks):
+            if not engine.step(agent.get_action(engine.get_observation())) or engine.is_stalled():
+                engine.seed += 1
+                engine.reset()
+
+        results.append(get_result("logic", "tick", {"mode": mode, "agent": agent.NAME}, ticks, time.perf_counter() - start))
+
+    return results
+
+
+def benchmark_logic(args):
+    return benchmark_snake_lengths() + benchmark_fill_levels() + benchmark_tick_rates()
+
+
+def benchmark_render(args):
+    from layout_handlers import GameInterface, HighScoreLayoutHandler
+    from game_modes import GAME_MODES
+
+    results = []
+    game_window = GameInterface(720, 480).get_game_window()
+
+    for mode, game_mode_class in GAME_MODES.items():
+        for dirty_rects in (True, False):
+            game_mode = game_mode_class(game_window, 0, dirty_rects)
+            agent = GreedyAgent()
+            agent.reset(0)
+            elapsed = 0
+
+            for frame in range(RENDER_FRAMES):
+                if not game_mode.engine.step(agent.get_action(game_mode.engine.get_observation())) or game_mode.engine.is_stalled():
+                    game_mode.engine.seed = frame
+                    game_mode.engine.reset()
+                    game_mode.redraw_all = True
+
+                start = time.perf_counter()
+                game_mode.add_new_window_contents()
+                game_mode.loHandler.update_game_window()
+                elapsed += time.perf_counter() - start
+
+            results.append(get_result("render", "add_new_window_contents", {"mode": mode, "dirty_rects": dirty_rects}, RENDER_FRAMES, elapsed))
+
+    lo_handler = game_mode.loHandler
+    frame = [0]
+
+    def update_changed_info():
+        frame[0] += 1
+        lo_handler.update_info_surface(game_mode.get_updated_info_fields(15, frame[0]))
+
+    results.append(benchmark_calls("render", "update_info_surface", {"changed": True}, update_changed_info))
+    results.append(benchmark_calls("render", "update_info_surface", {"changed": False}, lambda: lo_handler.update_info_surface(game_mode.get_updated_info_fields(15, 0))))
+
+    score_handler = HighScoreLayoutHandler(game_window)
+    rng = random.Random(0)
+    scores = [("AAAAA", mode, rng.randrange(1000), rng.random() * 100, time.time()) for _ in range(score_handler.DEFAULT_SCORES_DISP)]
+    totals = [len(scores), 1, 1, 5000, "500.00", 1]
+    results.append(benchmark_calls("render", "list_scores", {"rows": len(scores)}, lambda: score_handler.list_scores(scores, 0, totals)))
+
+    pygame.quit()
+    return results
+
+
+def get_synthetic_scores(rows, rng):
+    players = ["".join(rng.choice("ABCDEFGH") for _ in range(5)) for _ in range(200)]
+    modes = list(GAME_ENGINES)
+    start_date = time.time() - 365 * 24 * 3600
+
+    return [(rng.choice(players), rng.choice(modes), rng.randrange(0, 2000, SCORE_INTERVAL), rng.random() * 300, start_date + rng.random() * 365 * 24 * 3600) for _ in range(rows)]
+
+
+def benchmark_db(args):
+    from db_handlers import DatabaseHandler
+
+    results = []
+    rng = random.Random(0)
+
+    for rows in (rows for rows in DB_ROW_COUNTS if rows <= args.max_rows):
+        with tempfile.TemporaryDirectory() as db_directory:
+            dbHandler = DatabaseHandler(db_file=os.path.join(db_directory, "benchmark.db"))
+            scores = get_synthetic_scores(rows, rng)
+
+            start = time.perf_counter()
+            dbHandler.set_scores(scores)
+            results.append(get_result("db", "set_scores", {"rows": rows}, rows, time.perf_counter() - start))
+
+            mode = scores[0][1]
+            middle_key = dbHandler.get_score_page(mode, limit=len(scores))[rows // len(GAME_ENGINES) // 2]
+            params = {"rows": rows}
+
+            results.append(benchmark_calls("db", "get_top_scores", {**params, "mode": mode}, lambda: dbHandler.get_top_scores(mode)))
+            results.append(benchmark_calls("db", "get_top_scores", {**params, "mode": None}, lambda: dbHandler.get_top_scores(None)))
+            results.append(benchmark_calls("db", "get_score_page", {**params, "mode": mode, "page": "middle"}, lambda: dbHandler.get_score_page(mode, middle_key)))
+            results.append(benchmark_calls("db", "get_score_stats", {**params, "mode": mode}, lambda: dbHandler.get_score_stats(mode)))
+            results.append(benchmark_calls("db", "get_score_pager", {**params, "mode": mode}, lambda: dbHandler.get_score_pager(mode).get_window(0, dbHandler.DEFAULT_TOP_SCORES)))
+            results.append(benchmark_calls("db", "set_score", params, lambda: dbHandler.set_score("bench", mode, 0, 1.0, time.time())))
+
+            dbHandler.close()
+
+    return results
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    for result in results:
+        params = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(f"{result['suite']:7} {result['case']:26} {result['per_call_us']:12.2f} us {result['calls_per_s']:14.0f}/s  {params}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure game logic, rendering and database throughput.")
+    parser.add_argument("--suites", nargs="+", choices=BENCHMARK_SUITES, default=BENCHMARK_SUITES, help="benchmark suites to run")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS, help="largest synthetic score table, up to 10^6 rows")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file the results are written to")
+    return parser.parse_args()
+
+
+BENCHMARKS = {"logic": benchmark_logic, "render": benchmark_render, "db": benchmark_db}
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    results = []
+
+    for suite in args.suites:
+        suite_results = BENCHMARKS[suite](args)
+        print_results(suite_results)
+        results.extend(suite_results)
+
+    report = {
+        "revision": get_git_revision(),
+        "date": time.time(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "video_driver": os.environ["SDL_VIDEODRIVER"],
+        "results": results,
+    }
+
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print(f"{len(results)} results written to {args.output}")
@@ -1,22 +1,152 @@
+import csv
+import json
+import queue
 import sqlite3
+import threading
+from itertools import islice
+
+
+DB_FILE = "SNAKE_SCORE.db"
+DB_PRAGMAS = ["PRAGMA journal_mode=WAL;", "PRAGMA synchronous=NORMAL;"]
+
+SCORE_COLUMNS = ["player", "mode", "score", "time", "date"]
+SCORE_FILE_FORMATS = ["csv", "jsonl"]
+TRANSFER_CHUNK_SIZE = 5000
+
+
+def connect_database(db_file):
+    conn = sqlite3.connect(db_file)
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_score_file_format(path, file_format=None):
+    file_format = file_format or path.rsplit(".", 1)[-1].lower()
+
+    if file_format not in SCORE_FILE_FORMATS:
+        raise ValueError(f"Unknown score file format: {file_format}")
+
+    return file_format
+
+
+def to_score_row(record):
+    player, mode, score, time, date = record
+    return (str(player).upper(), str(mode), int(score), float(time), float(date))
+
+
+def read_score_rows(score_file, file_format):
+    if file_format == "csv":
+        for record in csv.DictReader(score_file):
+            yield to_score_row(record[column] for column in SCORE_COLUMNS)
+    else:
+        for line in score_file:
+            if line.strip():
+                record = json.loads(line)
+                yield to_score_row(record[column] for column in SCORE_COLUMNS)
+
+
+def iter_chunks(rows, chunk_size=TRANSFER_CHUNK_SIZE):
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+
+class ScoreWriter(threading.Thread):
+    BATCH_SIZE = 1000
+    STOP = None
+
+    def __init__(self, db_file):
+        super().__init__(name="ScoreWriter", daemon=True)
+        self.db_file = db_file
+        self.scores = queue.Queue()
+
+
+    def put(self, score):
+        self.scores.put(score)
+
+
+    def flush(self):
+        self.scores.join()
+
+
+    def stop(self):
+        self.scores.put(self.STOP)
+        self.join()
+
+
+    def get_batch(self):
+        batch = [self.scores.get()]
+
+        while batch[-1] is not self.STOP and len(batch) < self.BATCH_SIZE:
+            try:
+                batch.append(self.scores.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+
+    def run(self):
+        conn = connect_database(self.db_file)
+        running = True
+
+        while running:
+            batch = self.get_batch()
+            scores = [score for score in batch if score is not self.STOP]
+            running = len(scores) == len(batch)
+
+            try:
+                with conn:
+                    conn.executemany("INSERT INTO score VALUES(?,?,?,?,?);", scores)
+            except sqlite3.Error as error:
+                print(f"Could not save {len(scores)} scores: {error}")
+
+            for _ in batch:
+                self.scores.task_done()
+
+        conn.close()
+
 
 
 class DatabaseHandler:
     DEFAULT_ORDER = "ORDER BY score DESC, time ASC, date DESC"
+    DEFAULT_TOP_SCORES = 10
+    PAGE_KEY = [("score", "DESC"), ("time", "ASC"), ("date", "DESC"), ("mode", "ASC"), ("player", "ASC"), ("rowid", "ASC")]
 
 
-    def __init__(self):
-        self.conn = sqlite3.connect("SNAKE_SCORE.db")
+    def __init__(self, write_behind=False, db_file=DB_FILE):
+        self.conn = connect_database(db_file)
         self.cur = self.conn.cursor()
         self.create_score_table()
+        self.create_score_indexes()
+        self.create_score_stats()
+
+        self.writer = None
+        if write_behind:
+            self.writer = ScoreWriter(db_file)
+            self.writer.start()
 
 
     def __del__(self):
         print("Now being deleted....")
-        self.cur.close()
+        self.close()
+
+
+    def close(self):
+        if self.writer:
+            self.writer.stop()
+            self.writer = None
+
         self.conn.close()
 
 
+    def flush_scores(self):
+        if self.writer:
+            self.writer.flush()
+
+
     def create_score_table(self):
         try:
             self.cur.execute("""CREATE TABLE score(
@@ -31,52 +161,293 @@ class DatabaseHandler:
             # TABLE ALREADY EXISTS IN THE DATABASE
             pass
 
+
+    def create_score_indexes(self):
+        self.cur.execute("CREATE INDEX IF NOT EXISTS score_mode_rank ON score(mode, score DESC, time ASC, date DESC, player);")
+        self.cur.execute("CREATE INDEX IF NOT EXISTS score_rank ON score(score DESC, time ASC, date DESC, mode, player);")
+        self.cur.execute("CREATE INDEX IF NOT EXISTS score_date ON score(date);")
+        self.conn.commit()
+
+
+    def create_score_stats(self):
+        stats_exist = self.cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='score_stats';").fetchone()
+
+        # every game counts towards its own mode and towards the '' row covering all modes
+        self.cur.executescript("""
+            CREATE TABLE IF NOT EXISTS score_stats(
+                mode TEXT PRIMARY KEY, 
+                games INTEGER NOT NULL, 
+                players INTEGER NOT NULL, 
+                total_score INTEGER NOT NULL, 
+                total_time REAL NOT NULL, 
+                first_date REAL NOT NULL, 
+                last_date REAL NOT NULL, 
+                days INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS score_players(
+                mode TEXT NOT NULL, 
+                player TEXT NOT NULL, 
+                games INTEGER NOT NULL, 
+                PRIMARY KEY(mode, player)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS score_days(
+                mode TEXT NOT NULL, 
+                day TEXT NOT NULL, 
+                games INTEGER NOT NULL, 
+                PRIMARY KEY(mode, day)) WITHOUT ROWID;
+
+            CREATE TRIGGER IF NOT EXISTS score_stats_insert AFTER INSERT ON score BEGIN
+                INSERT INTO score_stats VALUES
+                    (NEW.mode, 1, 0, NEW.score, NEW.time, NEW.date, NEW.date, 0), 
+                    ('', 1, 0, NEW.score, NEW.time, NEW.date, NEW.date, 0)
+                    ON CONFLICT(mode) DO UPDATE SET 
+                        games = games + 1, 
+                        total_score = total_score + excluded.total_score, 
+                        total_time = total_time + excluded.total_time, 
+                        first_date = MIN(first_date, excluded.first_date), 
+                        last_date = MAX(last_date, excluded.last_date);
+                INSERT INTO score_players VALUES (NEW.mode, NEW.player, 1), ('', NEW.player, 1)
+                    ON CONFLICT(mode, player) DO UPDATE SET games = games + 1;
+                INSERT INTO score_days VALUES 
+                    (NEW.mode, date(NEW.date, 'unixepoch', 'localtime'), 1), 
+                    ('', date(NEW.date, 'unixepoch', 'localtime'), 1)
+                    ON CONFLICT(mode, day) DO UPDATE SET games = games + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS score_players_insert AFTER INSERT ON score_players BEGIN
+                UPDATE score_stats SET players = players + 1 WHERE mode = NEW.mode;
+            END;
+            CREATE TRIGGER IF NOT EXISTS score_days_insert AFTER INSERT ON score_days BEGIN
+                UPDATE score_stats SET days = days + 1 WHERE mode = NEW.mode;
+            END;
+        """)
+
+        if not stats_exist:
+            self.rebuild_score_stats()
+
+
+    def rebuild_score_stats(self):
+        self.clear_score_stats()
+        self.cur.executescript("""
+            INSERT INTO score_players 
+                SELECT mode, player, COUNT(*) FROM score GROUP BY mode, player 
+                UNION ALL SELECT '', player, COUNT(*) FROM score GROUP BY player;
+            INSERT INTO score_days 
+                SELECT mode, date(date, 'unixepoch', 'localtime') AS day, COUNT(*) FROM score GROUP BY mode, day 
+                UNION ALL SELECT '', date(date, 'unixepoch', 'localtime') AS day, COUNT(*) FROM score GROUP BY day;
+            INSERT INTO score_stats 
+                SELECT mode, COUNT(*), 
+                    (SELECT COUNT(*) FROM score_players p WHERE p.mode = s.mode), 
+                    SUM(score), SUM(time), MIN(date), MAX(date), 
+                    (SELECT COUNT(*) FROM score_days d WHERE d.mode = s.mode) 
+                FROM score s GROUP BY mode 
+                UNION ALL SELECT '', COUNT(*), 
+                    (SELECT COUNT(*) FROM score_players WHERE mode = ''), 
+                    SUM(score), SUM(time), MIN(date), MAX(date), 
+                    (SELECT COUNT(*) FROM score_days WHERE mode = '') 
+                FROM score HAVING COUNT(*) > 0;
+        """)
+        self.conn.commit()
+
+
+    def clear_score_stats(self):
+        self.cur.execute("DELETE FROM score_stats;")
+        self.cur.execute("DELETE FROM score_players;")
+        self.cur.execute("DELETE FROM score_days;")
+
+
+    def get_mode_filter(self, mode):
+        return ("WHERE mode=?", (mode, )) if mode else ("", ())
+
     
     def get_game_modes(self):
         return self.cur.execute("SELECT DISTINCT mode FROM score;").fetchall()
 
     
-    def get_all_scores(self):
-        return self.cur.execute(f"SELECT * FROM score {self.DEFAULT_ORDER};").fetchall()
+    def set_score(self, player, mode, score, time, date):
+        if self.writer:
+            self.writer.put((player.upper(), mode, score, time, date))
+            return
+
+        self.cur.execute("INSERT INTO score VALUES(?,?,?,?,?);", (player.upper(), mode, score, time, date))
+        self.conn.commit()
 
 
-    def get_mode_scores(self, mode=None):
-        if mode:
-            return self.cur.execute(f"SELECT * FROM score where mode=? {self.DEFAULT_ORDER};", (mode, )).fetchall()
-        else:
-            return self.get_all_scores()
+    def set_scores(self, scores):
+        if self.writer:
+            for player, *score in scores:
+                self.writer.put((player.upper(), *score))
+            return
 
-    
-    def set_score(self, player, mode, score, time, date):
-        self.cur.execute("INSERT INTO score VALUES(?,?,?,?,?);", (player.upper(), mode, score, time, date))
+        self.cur.executemany("INSERT INTO score VALUES(?,?,?,?,?);", [(player.upper(), *score) for player, *score in scores])
         self.conn.commit()
 
 
+    def get_score_count(self, mode=None):
+        score_stats = self.get_score_stats(mode)
+        return score_stats[0] if score_stats else 0
+
+
+    def get_page_condition(self, backwards):
+        condition = ""
+
+        # (a, b, c) after (x, y, z) becomes a > x OR (a = x AND (b > y OR (b = y AND c > z)))
+        for column, order in reversed(self.PAGE_KEY):
+            operator = "<" if (order == "DESC") != backwards else ">"
+            condition = f"{column} {operator} ?" + (f" OR ({column} = ? AND ({condition}))" if condition else "")
+
+        # the leading bound on its own lets SQLite seek into the index
+        return f"{column} {operator}= ? AND ({condition})"
+
+
+    def get_page_params(self, key):
+        params = [key[-1]]
+        for value in reversed(key[:-1]):
+            params = [value, value, *params]
+        return [key[0], *params]
+
+
+    def get_score_page(self, mode=None, after_key=None, limit=DEFAULT_TOP_SCORES, backwards=False):
+        mode_filter, params = self.get_mode_filter(mode)
+        conditions = [mode_filter.removeprefix("WHERE ")] if mode_filter else []
+
+        if after_key:
+            conditions.append(f"({self.get_page_condition(backwards)})")
+            params = (*params, *self.get_page_params(after_key))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = ", ".join(f"{column} {order if not backwards else ('ASC' if order == 'DESC' else 'DESC')}" for column, order in self.PAGE_KEY)
+        rows = self.cur.execute(f"SELECT score, time, date, mode, player, rowid FROM score {where} ORDER BY {order} LIMIT ?;", (*params, limit)).fetchall()
+
+        return rows[::-1] if backwards else rows
+
+
+    def get_top_scores(self, mode=None, limit=DEFAULT_TOP_SCORES):
+        mode_filter, params = self.get_mode_filter(mode)
+        return self.cur.execute(f"SELECT * FROM score {mode_filter} {self.DEFAULT_ORDER} LIMIT ?;", (*params, limit)).fetchall()
+
+
     def get_top_10_scores(self, mode):
-        return self.get_high_scores(mode)[:10]
+        return self.get_top_scores(mode, 10)
 
 
     def get_all_time_top_10(self):
-        return self.cur.execute("SELECT * FROM score ORDER BY score DESC LIMIT 10;").fetchall()
+        return self.get_top_scores(None, 10)
 
 
     def delete_all_scores(self):
+        self.flush_scores()
         self.cur.execute("DELETE FROM score;")
+        self.clear_score_stats()
         self.conn.commit()
 
 
-    def get_totals(self, mode=""):
-        return self.cur.execute("""SELECT COUNT(*), 
-            COUNT(DISTINCT player), 
-            COUNT(DISTINCT mode), 
-            SUM(score), 
-            SUM(time), 
-            MIN(date), 
-            MAX(date) 
-            FROM score WHERE mode LIKE ?;""", (f"%{mode}%", )
+    def get_score_stats(self, mode=""):
+        return self.cur.execute("""SELECT games, 
+            players, 
+            CASE WHEN mode = '' THEN (SELECT COUNT(*) FROM score_stats WHERE mode != '') ELSE 1 END, 
+            total_score, 
+            total_time, 
+            first_date, 
+            last_date, 
+            days 
+            FROM score_stats WHERE mode = ?;""", (mode or "", )
         ).fetchone()
 
 
-    def get_all_dates(self, mode=""):
-        return self.cur.execute("SELECT date FROM score WHERE mode LIKE ?", (f"%{mode}%", )).fetchall()
+    def get_score_pager(self, mode=None, page_size=DEFAULT_TOP_SCORES):
+        return ScorePager(self, mode, page_size)
+
+
+    def export_scores(self, path, mode=None, file_format=None):
+        file_format = get_score_file_format(path, file_format)
+        mode_filter, params = self.get_mode_filter(mode)
+        self.flush_scores()
+
+        cursor = self.conn.execute(f"SELECT {', '.join(SCORE_COLUMNS)} FROM score {mode_filter};", params)
+        exported = 0
+
+        with open(path, "w", newline="", encoding="utf-8") as score_file:
+            writer = csv.writer(score_file) if file_format == "csv" else None
+            if writer:
+                writer.writerow(SCORE_COLUMNS)
+
+            while rows := cursor.fetchmany(TRANSFER_CHUNK_SIZE):
+                if writer:
+                    writer.writerows(rows)
+                else:
+                    score_file.writelines(json.dumps(dict(zip(SCORE_COLUMNS, row))) + "\n" for row in rows)
+                exported += len(rows)
+
+        cursor.close()
+        return exported
+
+
+    def import_scores(self, path, deduplicate=False, file_format=None):
+        file_format = get_score_file_format(path, file_format)
+        self.flush_scores()
+
+        # stage the file first so the score indexes and stats triggers see one sorted insert
+        self.cur.execute("CREATE TEMP TABLE IF NOT EXISTS score_import AS SELECT * FROM score WHERE 0;")
+        self.cur.execute("DELETE FROM score_import;")
+
+        # the five columns are all covered by score_mode_rank, so the duplicate check is an index lookup
+        duplicate_filter = """WHERE NOT EXISTS (SELECT 1 FROM score s WHERE s.mode = i.mode AND s.score = i.score 
+            AND s.time = i.time AND s.date = i.date AND s.player = i.player)""" if deduplicate else ""
+
+        with open(path, newline="", encoding="utf-8") as score_file, self.conn:
+            for rows in iter_chunks(read_score_rows(score_file, file_format)):
+                self.cur.executemany("INSERT INTO score_import VALUES(?,?,?,?,?);", rows)
+
+            self.cur.execute(f"""INSERT INTO score 
+                SELECT {'DISTINCT' if deduplicate else ''} i.* FROM score_import i {duplicate_filter} 
+                ORDER BY i.mode, i.score DESC, i.time, i.date DESC, i.player;""")
+            imported = self.cur.rowcount
+            self.cur.execute("DELETE FROM score_import;")
+
+        return imported
+
+
+
+class ScorePager:
+    PREFETCH_ROWS = 20
+
+    def __init__(self, dbHandler, mode, page_size):
+        self.dbHandler = dbHandler
+        self.mode = mode
+        self.page_size = page_size
+        self.total = self.dbHandler.get_score_count(self.mode)
+        self.first_rank = 0
+        self.rows = self.dbHandler.get_score_page(self.mode, limit=self.page_size + self.PREFETCH_ROWS)
+
+
+    def __len__(self):
+        return self.total
+
+
+    def fetch_after(self, amount):
+        if self.rows and self.first_rank + len(self.rows) < self.total:
+            self.rows += self.dbHandler.get_score_page(self.mode, self.rows[-1], amount)
+
+
+    def fetch_before(self, amount):
+        if self.rows and self.first_rank > 0:
+            rows = self.dbHandler.get_score_page(self.mode, self.rows[0], amount, True)
+            self.rows = rows + self.rows
+            self.first_rank -= len(rows)
+
+
+    def trim_rows(self, start, amount):
+        keep_from = max(0, start - self.PREFETCH_ROWS - self.first_rank)
+        keep_to = start + amount + self.PREFETCH_ROWS - self.first_rank
+        self.rows = self.rows[keep_from:keep_to]
+        self.first_rank += keep_from
+
+
+    def get_window(self, start, amount):
+        if start < self.first_rank:
+            self.fetch_before(self.first_rank - start + self.PREFETCH_ROWS)
+        if start + amount > self.first_rank + len(self.rows):
+            self.fetch_after(start + amount - self.first_rank - len(self.rows) + self.PREFETCH_ROWS)
+
+        self.trim_rows(start, amount)
+        window = self.rows[start - self.first_rank:start - self.first_rank + amount]
 
+        return [(player, mode, score, time, date) for score, time, date, mode, player, _ in window]
@@ -0,0 +1,139 @@
+import json
+import time
+from array import array
+
+
+FRAME_PHASES = ["input", "agent", "logic", "draw", "info", "display"]
+FRAME_HISTORY = 1024
+REPORT_PERCENTILES = [50, 95, 99]
+HUD_INTERVAL = 30
+
+
+class NoFrameProfiler:
+    hud = False
+
+    def start_frame(self, deadline):
+        pass
+
+
+    def mark(self, phase):
+        pass
+
+
+    def end_frame(self):
+        pass
+
+
+    def get_hud_text(self):
+        return ""
+
+
+    def end_game(self, game_mode):
+        pass
+
+
+
+class FrameProfiler(NoFrameProfiler):
+
+    def __init__(self, history=FRAME_HISTORY, report_path=None, hud=False, report=True):
+        self.history = history
+        self.report_path = report_path
+        self.report = report
+        self.hud = hud
+        self.phase_indexes = {phase: i for i, phase in enumerate(FRAME_PHASES)}
+        self.reset()
+
+
+    def reset(self):
+        # one row of phase durations per frame, the oldest frames get overwritten
+        self.durations = array("q", bytes(8 * self.history * len(FRAME_PHASES)))
+        self.frame_times = array("q", bytes(8 * self.history))
+        self.frames = 0
+        self.missed_deadlines = 0
+        self.frame_phases = [0] * len(FRAME_PHASES)
+        self.hud_text = ""
+
+
+    def start_frame(self, deadline):
+        self.deadline = int(deadline * 1e9)
+        self.frame_phases = [0] * len(FRAME_PHASES)
+        self.frame_start = self.last_mark = time.perf_counter_ns()
+
+
+    def mark(self, phase):
+        now = time.perf_counter_ns()
+        self.frame_phases[self.phase_indexes[phase]] += now - self.last_mark
+        self.last_mark = now
+
+
+    def end_frame(self):
+        row = self.frames % self.history
+        frame_time = self.last_mark - self.frame_start
+
+        self.durations[row * len(FRAME_PHASES):(row + 1) * len(FRAME_PHASES)] = array("q", self.frame_phases)
+        self.frame_times[row] = frame_time
+        self.frames += 1
+
+        if frame_time > self.deadline:
+            self.missed_deadlines += 1
+
+
+    def get_recorded_frames(self):
+        return min(self.frames, self.history)
+
+
+    def get_phase_durations(self, phase):
+        phase_index = self.phase_indexes[phase]
+        return self.durations[phase_index:self.get_recorded_frames() * len(FRAME_PHASES):len(FRAME_PHASES)]
+
+
+    @staticmethod
+    def get_percentiles(durations):
+        durations = sorted(durations)
+        if not durations:
+            return [0 for _ in REPORT_PERCENTILES]
+
+        return [durations[min(len(durations) - 1, len(durations) * percent // 100)] / 1e6 for percent in REPORT_PERCENTILES]
+
+
+    def get_report(self, game_mode=None):
+        report = {
+            "mode": game_mode,
+            "frames": self.frames,
+            "recorded_frames": self.get_recorded_frames(),
+            "missed_deadlines": self.missed_deadlines,
+            "percentiles": REPORT_PERCENTILES,
+            "frame_ms": self.get_percentiles(self.frame_times[:self.get_recorded_frames()]),
+            "phases_ms": {phase: self.get_percentiles(self.get_phase_durations(phase)) for phase in FRAME_PHASES},
+        }
+
+        return report
+
+
+    def print_report(self, report):
+        print(f"{report['frames']} frames, {report['missed_deadlines']} missed deadlines")
+        print("PHASE".ljust(8) + "".join(f"P{percent} (ms)".rjust(12) for percent in REPORT_PERCENTILES))
+
+        for phase, percentiles in (("frame", report["frame_ms"]), *report["phases_ms"].items()):
+            print(phase.ljust(8) + "".join(f"{percentile:.3f}".rjust(12) for percentile in percentiles))
+
+
+    def get_hud_text(self):
+        # sorting the history every frame would cost more than the text it shows
+        if self.frames % HUD_INTERVAL == 1:
+            frames = self.frame_times[:self.get_recorded_frames()]
+            self.hud_text = f"P95: {self.get_percentiles(frames)[1]:.1f} ms"
+
+        return self.hud_text
+
+
+    def end_game(self, game_mode):
+        report = self.get_report(game_mode)
+
+        if self.report_path:
+            with open(self.report_path, "a") as report_file:
+                report_file.write(json.dumps(report) + "\n")
+        elif self.report:
+            self.print_report(report)
+
+        self.reset()
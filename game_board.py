@@ -0,0 +1,438 @@
+EMPTY_CELL = 0
+BODY_CELL = 1
+WALL_CELL = 2
+POISON_CELL = 3
+APPLE_CELL = 4
+OUT_OF_BOUNDS = 255
+
+HORIZONTAL = "horizontal"
+VERTICAL = "vertical"
+
+CHUNK_SIZE = 32
+RUN_SAMPLE_TRIES = 64
+
+
+class CellIndex:
+
+    def __init__(self, size, filled=False):
+        self.items = list(range(size)) if filled else []
+        self.positions = list(range(size)) if filled else [-1] * size
+
+
+    def __len__(self):
+        return len(self.items)
+
+
+    def copy(self):
+        cell_index = CellIndex(0)
+        cell_index.items = self.items.copy()
+        cell_index.positions = self.positions.copy()
+        return cell_index
+
+
+    def __contains__(self, item):
+        return self.positions[item] >= 0
+
+
+    def add(self, item):
+        if self.positions[item] >= 0:
+            return
+
+        self.positions[item] = len(self.items)
+        self.items.append(item)
+
+
+    def remove(self, item):
+        position = self.positions[item]
+        if position < 0:
+            return
+
+        last_item = self.items.pop()
+        if last_item != item:
+            self.items[position] = last_item
+            self.positions[last_item] = position
+
+        self.positions[item] = -1
+
+
+    def choice(self, rng):
+        if not self.items:
+            return None
+
+        return self.items[rng.randrange(len(self.items))]
+
+
+    def sample(self, rng, amount):
+        amount = min(amount, len(self.items))
+        return [self.items[i] for i in rng.sample(range(len(self.items)), amount)]
+
+
+
+class BoardGrid:
+
+    def __init__(self, board_size, run_length=None):
+        self.board_x, self.board_y = board_size
+        self.run_length = run_length
+        self.track_changes = False
+
+        if self.run_length:
+            self.init_empty_run_starts()
+
+        self.reset()
+
+
+    def reset(self):
+        self.cells = bytearray(self.board_x * self.board_y)
+        self.free_cells = CellIndex(len(self.cells), True)
+        self.changed_cells = set()
+
+        if self.run_length:
+            self.run_starts = {direction: starts.copy() for direction, starts in self.empty_run_starts.items()}
+
+
+    def init_empty_run_starts(self):
+        board_size = self.board_x * self.board_y
+        self.empty_run_starts = {HORIZONTAL: CellIndex(board_size), VERTICAL: CellIndex(board_size)}
+
+        for y in range(self.board_y):
+            for x in range(self.board_x):
+                if x + self.run_length <= self.board_x:
+                    self.empty_run_starts[HORIZONTAL].add(y * self.board_x + x)
+                if y + self.run_length <= self.board_y:
+                    self.empty_run_starts[VERTICAL].add(y * self.board_x + x)
+
+
+    def get_run_axes(self, location):
+        return (
+            (self.run_starts[HORIZONTAL], location[0], self.board_x, 1),
+            (self.run_starts[VERTICAL], location[1], self.board_y, self.board_x),
+        )
+
+
+    def count_free_run(self, index, step, max_cells):
+        count = 0
+        while count < max_cells and self.cells[index + (count + 1) * step] == EMPTY_CELL:
+            count += 1
+
+        return count
+
+
+    def close_runs(self, location, index):
+        for run_starts, position, _, step in self.get_run_axes(location):
+            for i in range(min(self.run_length, position + 1)):
+                start_index = index - i * step
+
+                # starts before another occupied cell were never valid
+                if i and self.cells[start_index] != EMPTY_CELL:
+                    break
+
+                run_starts.remove(start_index)
+
+
+    def open_runs(self, location, index):
+        for run_starts, position, limit, step in self.get_run_axes(location):
+            free_before = self.count_free_run(index, -step, min(self.run_length - 1, position))
+            free_after = self.count_free_run(index, step, min(self.run_length - 1, limit - position - 1))
+
+            # every start between the two free runs that still fits a full run
+            for i in range(max(0, self.run_length - 1 - free_after), free_before + 1):
+                run_starts.add(index - i * step)
+
+
+    def to_location(self, index):
+        return (index % self.board_x, index // self.board_x)
+
+
+    def in_bounds(self, location):
+        return 0 <= location[0] < self.board_x and 0 <= location[1] < self.board_y
+
+
+    def get(self, location):
+        if not self.in_bounds(location):
+            return OUT_OF_BOUNDS
+
+        return self.cells[location[1] * self.board_x + location[0]]
+
+
+    def set(self, location, cell_type):
+        index = location[1] * self.board_x + location[0]
+        old_type = self.cells[index]
+        self.cells[index] = cell_type
+
+        if self.track_changes and old_type != cell_type:
+            self.changed_cells.add(index)
+
+        if old_type == EMPTY_CELL and cell_type != EMPTY_CELL:
+            self.free_cells.remove(index)
+            if self.run_length:
+                self.close_runs(location, index)
+        elif old_type != EMPTY_CELL and cell_type == EMPTY_CELL:
+            self.free_cells.add(index)
+            if self.run_length:
+                self.open_runs(location, index)
+
+
+    def clear(self, location):
+        self.set(location, EMPTY_CELL)
+
+
+    def set_many(self, locations, cell_type):
+        for location in locations:
+            self.set(location, cell_type)
+
+
+    def clear_many(self, locations):
+        self.set_many(locations, EMPTY_CELL)
+
+
+    def pop_changed_cells(self):
+        changed_cells = [self.to_location(index) for index in self.changed_cells]
+        self.changed_cells.clear()
+        return changed_cells
+
+
+    def is_full(self):
+        return len(self.free_cells) == 0
+
+
+    def get_free_location(self, rng):
+        index = self.free_cells.choice(rng)
+        return None if index is None else self.to_location(index)
+
+
+    def get_free_locations(self, rng, amount):
+        return [self.to_location(index) for index in self.free_cells.sample(rng, amount)]
+
+
+    def get_run_start(self, rng, direction):
+        index = self.run_starts[direction].choice(rng)
+        return None if index is None else self.to_location(index)
+
+
+    def get_cells_view(self):
+        return memoryview(self.cells).toreadonly()
+
+
+    def iter_cells(self, x0, y0, x1, y1):
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, self.board_x), min(y1, self.board_y)
+
+        for y in range(y0, y1):
+            row_start = y * self.board_x
+            for x, cell in enumerate(self.cells[row_start + x0:row_start + x1], x0):
+                if cell != EMPTY_CELL:
+                    yield (x, y), cell
+
+
+
+class FreeCountTree:
+
+    def __init__(self, counts):
+        # a Fenwick tree, so a free cell can be picked by rank without walking every chunk
+        self.size = len(counts)
+        self.tree = [0] + list(counts)
+
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+
+    def add(self, index, delta):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+
+    def find(self, rank):
+        position = 0
+        bit = 1 << self.size.bit_length()
+
+        while bit:
+            next_position = position + bit
+            if next_position <= self.size and self.tree[next_position] <= rank:
+                position = next_position
+                rank -= self.tree[position]
+            bit >>= 1
+
+        return position, rank
+
+
+
+class ChunkedBoardGrid:
+
+    def __init__(self, board_size, run_length=None):
+        self.board_x, self.board_y = board_size
+        self.run_length = run_length
+        self.track_changes = False
+
+        self.chunks_x = -(-self.board_x // CHUNK_SIZE)
+        self.chunks_y = -(-self.board_y // CHUNK_SIZE)
+        self.chunk_sizes = [
+            (min(CHUNK_SIZE, self.board_x - cx * CHUNK_SIZE), min(CHUNK_SIZE, self.board_y - cy * CHUNK_SIZE))
+            for cy in range(self.chunks_y) for cx in range(self.chunks_x)
+        ]
+
+        self.reset()
+
+
+    def reset(self):
+        # only chunks holding something are stored, an absent chunk is all empty
+        self.chunks = {}
+        self.free_counts = [width * height for width, height in self.chunk_sizes]
+        self.free_tree = FreeCountTree(self.free_counts)
+        self.free_total = self.board_x * self.board_y
+        self.changed_cells = set()
+
+
+    def get_chunk_position(self, location):
+        x, y = location
+        chunk = (y // CHUNK_SIZE) * self.chunks_x + x // CHUNK_SIZE
+        return chunk, (y % CHUNK_SIZE) * self.chunk_sizes[chunk][0] + x % CHUNK_SIZE
+
+
+    def get_chunk_location(self, chunk, position):
+        width = self.chunk_sizes[chunk][0]
+        return ((chunk % self.chunks_x) * CHUNK_SIZE + position % width, (chunk // self.chunks_x) * CHUNK_SIZE + position // width)
+
+
+    def in_bounds(self, location):
+        return 0 <= location[0] < self.board_x and 0 <= location[1] < self.board_y
+
+
+    def get(self, location):
+        if not self.in_bounds(location):
+            return OUT_OF_BOUNDS
+
+        chunk, position = self.get_chunk_position(location)
+        cells = self.chunks.get(chunk)
+        return EMPTY_CELL if cells is None else cells[position]
+
+
+    def set(self, location, cell_type):
+        chunk, position = self.get_chunk_position(location)
+        cells = self.chunks.get(chunk)
+
+        if cells is None:
+            if cell_type == EMPTY_CELL:
+                return
+
+            width, height = self.chunk_sizes[chunk]
+            cells = self.chunks[chunk] = bytearray(width * height)
+
+        old_type = cells[position]
+        cells[position] = cell_type
+
+        if self.track_changes and old_type != cell_type:
+            self.changed_cells.add(tuple(location))
+
+        if old_type == EMPTY_CELL and cell_type != EMPTY_CELL:
+            self.add_free_cells(chunk, -1)
+        elif old_type != EMPTY_CELL and cell_type == EMPTY_CELL:
+            self.add_free_cells(chunk, 1)
+
+            if self.free_counts[chunk] == len(cells):
+                del self.chunks[chunk]
+
+
+    def add_free_cells(self, chunk, delta):
+        self.free_counts[chunk] += delta
+        self.free_tree.add(chunk, delta)
+        self.free_total += delta
+
+
+    def clear(self, location):
+        self.set(location, EMPTY_CELL)
+
+
+    def set_many(self, locations, cell_type):
+        for location in locations:
+            self.set(location, cell_type)
+
+
+    def clear_many(self, locations):
+        self.set_many(locations, EMPTY_CELL)
+
+
+    def pop_changed_cells(self):
+        changed_cells = list(self.changed_cells)
+        self.changed_cells.clear()
+        return changed_cells
+
+
+    def is_full(self):
+        return self.free_total == 0
+
+
+    def get_free_cell(self, rank):
+        chunk, rank = self.free_tree.find(rank)
+        cells = self.chunks.get(chunk)
+        position = rank
+
+        if cells is not None:
+            position = -1
+            for _ in range(rank + 1):
+                position = cells.find(EMPTY_CELL, position + 1)
+
+        return self.get_chunk_location(chunk, position)
+
+
+    def get_free_location(self, rng):
+        if not self.free_total:
+            return None
+
+        return self.get_free_cell(rng.randrange(self.free_total))
+
+
+    def get_free_locations(self, rng, amount):
+        return [self.get_free_cell(rank) for rank in rng.sample(range(self.free_total), min(amount, self.free_total))]
+
+
+    def is_free_run(self, location, step):
+        return all(self.get((location[0] + i * step[0], location[1] + i * step[1])) == EMPTY_CELL for i in range(self.run_length))
+
+
+    def get_run_start(self, rng, direction):
+        step = (1, 0) if direction == HORIZONTAL else (0, 1)
+        max_x, max_y = self.board_x - 1 - (self.run_length - 1) * step[0], self.board_y - 1 - (self.run_length - 1) * step[1]
+        if max_x < 0 or max_y < 0:
+            return None
+
+        for _ in range(RUN_SAMPLE_TRIES):
+            location = (rng.randint(0, max_x), rng.randint(0, max_y))
+            if self.is_free_run(location, step):
+                return location
+
+        # a crowded board, walk every start from a random one instead
+        starts = (max_x + 1) * (max_y + 1)
+        first_start = rng.randrange(starts)
+        for i in range(starts):
+            start = (first_start + i) % starts
+            location = (start % (max_x + 1), start // (max_x + 1))
+            if self.is_free_run(location, step):
+                return location
+
+        return None
+
+
+    def get_cells_view(self):
+        return None
+
+
+    def iter_cells(self, x0, y0, x1, y1):
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, self.board_x), min(y1, self.board_y)
+
+        for cy in range(y0 // CHUNK_SIZE, -(-y1 // CHUNK_SIZE)):
+            for cx in range(x0 // CHUNK_SIZE, -(-x1 // CHUNK_SIZE)):
+                chunk = cy * self.chunks_x + cx
+                cells = self.chunks.get(chunk)
+                if cells is None:
+                    continue
+
+                width, height = self.chunk_sizes[chunk]
+                left, top = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+                for y in range(max(y0, top), min(y1, top + height)):
+                    row_start = (y - top) * width - left
+                    for x in range(max(x0, left), min(x1, left + width)):
+                        if cells[row_start + x] != EMPTY_CELL:
+                            yield (x, y), cells[row_start + x]
@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import json
+import pygame
+from layout_handlers import *
+from game_engine import *
+from game_modes import CELL_COLORS, DISPLAY_FPS
+from game_server import SERVER_HOST, SERVER_PORT, DIRECTION_NAMES, DIRECTION_KEYS, encode_message
+
+
+GAME_OVER_DELAY = 2
+
+
+class SnakeClient:
+
+    def __init__(self, game_window):
+        self.loHandler = SnakeLayoutHandler(game_window)
+        self.cells = {}
+        self.state = None
+        self.mode = ""
+        self.paused = False
+        self.playing = True
+        self.game_over = False
+
+
+    def to_pixels(self, locations):
+        return [[x * PIXEL_SIZE, y * PIXEL_SIZE] for x, y in locations]
+
+
+    def set_cells(self, cells):
+        # the client only mirrors what the server reports, it never runs the rules itself
+        for x, y, cell in cells:
+            if cell == EMPTY_CELL:
+                self.cells.pop((x, y), None)
+            else:
+                self.cells[(x, y)] = cell
+
+            self.loHandler.add_blocks_game_surface(self.to_pixels([(x, y)]), CELL_COLORS[cell], PIXEL_SIZE)
+
+
+    def add_snake_head(self, state):
+        self.loHandler.add_snake_head_to_game_surface(self.to_pixels([state["head"]])[0], DIRECTION_NAMES[state["direction"]], SNAKE_GREEN, PIXEL_SIZE)
+
+
+    def redraw_board(self):
+        self.loHandler.clear_game_surface()
+        self.set_cells([[x, y, cell] for (x, y), cell in self.cells.items()])
+        self.add_snake_head(self.state)
+
+
+    def handle_message(self, message):
+        message_type = message["type"]
+
+        if message_type == "start":
+            self.cells = {}
+            self.state = message
+            self.loHandler.clear_game_surface()
+            self.set_cells(message["cells"])
+            self.add_snake_head(message)
+        elif message_type == "tick":
+            neck = self.state["head"]
+            self.state = message
+            self.set_cells(message["cells"])
+
+            # the head of the last move may be off the board
+            if not message["playing"]:
+                return
+
+            self.loHandler.add_blocks_game_surface(self.to_pixels([neck]), SNAKE_GREEN, PIXEL_SIZE)
+            self.add_snake_head(message)
+        elif message_type == "pause":
+            self.paused = message["paused"]
+            if self.paused:
+                self.loHandler.set_middle_screen_text("GAME IS PAUSED", SNAKE_WHITE)
+            else:
+                self.redraw_board()
+        elif message_type == "over":
+            if message["board_full"]:
+                self.loHandler.set_middle_screen_text(f"BOARD FULL! Score: {message['score']}", SNAKE_GREEN)
+            else:
+                self.loHandler.set_middle_screen_text(f"GAME OVER! Score: {message['score']}", SNAKE_RED)
+            self.playing = False
+            self.game_over = True
+        elif message_type == "error":
+            print(f"Server error: {message['message']}")
+            self.playing = False
+
+
+    def get_info_fields(self):
+        state = self.state or {"score": 0, "speed": 0, "time": 0}
+
+        return [
+            f"SCORE: {state['score']}",
+            f"MODE: {self.mode}",
+            f"SPEED: {0 if self.paused else state['speed']}",
+            f"TIME: {int(state['time'])} s",
+        ]
+
+
+    async def read_messages(self, reader):
+        async for line in reader:
+            self.handle_message(json.loads(line))
+
+        self.playing = False
+
+
+    def handle_event(self, event, send):
+        if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+            self.playing = False
+        elif event.type == pygame.KEYDOWN and event.key in DIRECTION_KEYS:
+            send({"type": "turn", "direction": DIRECTION_KEYS[event.key]})
+        elif event.type == pygame.KEYDOWN and event.key == PAUSE_KEY:
+            send({"type": "pause"})
+
+
+    async def run(self, reader, writer, mode, player=None, board_size=DEFAULT_BOARD_SIZE, seed=None):
+        def send(message):
+            writer.write(encode_message(message))
+
+        self.mode = mode
+        send({"type": "start", "mode": mode, "board_size": board_size, "seed": seed, "player": player})
+        reading = asyncio.create_task(self.read_messages(reader))
+
+        # the server keeps time, the client only turns keys into commands and shows the updates
+        while self.playing and not reading.done():
+            for event in pygame.event.get():
+                self.handle_event(event, send)
+
+            self.loHandler.update_info_surface(self.get_info_fields())
+            self.loHandler.update_game_window()
+            await asyncio.sleep(1 / DISPLAY_FPS)
+
+        self.loHandler.update_info_surface(self.get_info_fields())
+        self.loHandler.update_game_window()
+
+        # the result stays up a moment unless the player left on their own
+        if self.game_over:
+            await asyncio.sleep(GAME_OVER_DELAY)
+
+        if not reading.done():
+            send({"type": "quit"})
+            reading.cancel()
+
+        writer.close()
+
+
+
+async def play_online(args):
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+
+    board_x, board_y = args.board or DEFAULT_BOARD_SIZE
+    game_interface = GameInterface(board_x * PIXEL_SIZE, board_y * PIXEL_SIZE + INFO_SURFACE_HEIGHT)
+
+    client = SnakeClient(game_interface.get_game_window())
+    await client.run(reader, writer, args.mode, args.player, [board_x, board_y], args.seed)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Play a game of snake hosted by game_server.py.")
+    parser.add_argument("--host", default=SERVER_HOST, help="address of the game server")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="TCP port of the game server")
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--mode", choices=list(GAME_ENGINES), default="Standard", help="game mode to play")
+    parser.add_argument("--player", help="name the score is saved under, games without one are not saved")
+    parser.add_argument("--board", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help=f"board size in cells, at most {DEFAULT_BOARD_SIZE[0]} {DEFAULT_BOARD_SIZE[1]}")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the game")
+    args = parser.parse_args()
+
+    # the client draws the whole board in its window, it has no camera to scroll with
+    if args.board and not (is_valid_board_size(args.board) and all(size <= limit for size, limit in zip(args.board, DEFAULT_BOARD_SIZE))):
+        parser.error(f"--board must be between {MIN_BOARD_SIZE[0]} {MIN_BOARD_SIZE[1]} and {DEFAULT_BOARD_SIZE[0]} {DEFAULT_BOARD_SIZE[1]}")
+
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(play_online(parse_arguments()))
+    GameInterface.quit()
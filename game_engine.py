@@ -0,0 +1,307 @@
+import pygame
+import random
+from collections import deque
+from game_board import *
+
+
+DEFAULT_BOARD_SIZE = (72, 45)
+DEFAULT_SNAKE_SPEED = 15
+DEFAULT_SNAKE_HEAD = [10, 5]
+DEFAULT_SNAKE_LENGTH = 4
+SPEED_FF_INCREASE = 2
+APPLE_SPEED_UP_INTERVAL = 3
+DEFAULT_LIVES = 3
+START_DIRECTION = pygame.K_RIGHT
+SCORE_INTERVAL = 10
+
+WALL_LENGTH = 16
+DEFAULT_WALLS = 1
+WALL_DIRECTIONS = [HORIZONTAL, VERTICAL]
+
+DEFAULT_POISONED_APPLES = 3
+
+PAUSE_KEY = pygame.K_SPACE
+VALID_KEYS = [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]
+OPPOSITES = {pygame.K_UP: pygame.K_DOWN,
+    pygame.K_DOWN: pygame.K_UP,
+    pygame.K_LEFT: pygame.K_RIGHT,
+    pygame.K_RIGHT: pygame.K_LEFT,
+}
+DIRECTION_STEPS = {pygame.K_UP: (0, -1),
+    pygame.K_DOWN: (0, 1),
+    pygame.K_LEFT: (-1, 0),
+    pygame.K_RIGHT: (1, 0),
+}
+
+HEADLESS_TURN_CHANCE = 0.2
+MAX_GAME_SEED = 1 << 32
+
+CHUNKED_GRID_CELLS = 1 << 16
+MIN_BOARD_SIZE = (DEFAULT_SNAKE_HEAD[0] + 1, DEFAULT_SNAKE_HEAD[1] + 1)
+
+
+def is_valid_board_size(board_size):
+    # the starting snake has to fit, its head is the rightmost cell of it
+    return all(size >= minimum for size, minimum in zip(board_size, MIN_BOARD_SIZE))
+
+
+class BoardObservation:
+
+    def __init__(self, engine):
+        self.board_x, self.board_y = engine.board_x, engine.board_y
+        # a flat view of the board, None for chunked boards
+        self.cells = engine.grid.get_cells_view()
+        self.get_cell = engine.grid.get
+        self.deadly_cells = engine.DEADLY_CELLS
+        self.snake_head = tuple(engine.snake_head)
+        self.snake_tail = engine.snake_body[-1]
+        self.snake_length = len(engine.snake_body)
+        self.head_direction = engine.head_direction
+        self.apple_location = engine.apple_location
+        self.score = engine.score
+        self.ticks = engine.ticks
+
+
+    def is_deadly(self, location):
+        return self.get_cell(location) in self.deadly_cells
+
+
+
+class StandardEngine:
+    GAME_MODE = "Standard"
+    DEADLY_CELLS = {OUT_OF_BOUNDS, BODY_CELL}
+    GRID_RUN_LENGTH = None
+
+    def __init__(self, board_size=DEFAULT_BOARD_SIZE, seed=None):
+        self.board_x, self.board_y = board_size
+        self.seed = seed
+
+        # big boards keep their cells in chunks so memory and tick cost don't grow with the area
+        grid_class = ChunkedBoardGrid if self.board_x * self.board_y > CHUNKED_GRID_CELLS else BoardGrid
+        self.grid = grid_class(board_size, self.GRID_RUN_LENGTH)
+        self.reset()
+
+
+    def reset(self):
+        self.game_seed = self.seed if self.seed is not None else random.randrange(MAX_GAME_SEED)
+        self.random = random.Random(self.game_seed)
+        self.head_direction = START_DIRECTION
+        self.picked_apples = 0
+        self.score = 0
+        self.ticks = 0
+        self.last_apple_tick = 0
+        self.play_time = 0
+        self.alive = True
+        self.board_full = False
+        self.apple_spawned = False
+        self.apple_location = ()
+        self.head_cell = EMPTY_CELL
+        self.snake_head = DEFAULT_SNAKE_HEAD.copy()
+        self.snake_body = deque((self.snake_head[0] - i, self.snake_head[1]) for i in range(DEFAULT_SNAKE_LENGTH))
+        self.grid.reset()
+        self.grid.set_many(self.snake_body, BODY_CELL)
+        self.update_apple_if_needed()
+
+
+    def location_is_occupied(self, locations):
+        return any(self.grid.get(loc) != EMPTY_CELL for loc in locations)
+
+
+    def get_new_location(self):
+        return self.grid.get_free_location(self.random)
+
+
+    def update_apple_if_needed(self):
+        if self.apple_spawned:
+            return False
+
+        new_location = self.get_new_location()
+
+        if new_location is None:
+            self.board_full = True
+            return False
+
+        self.apple_location = new_location
+        self.grid.set(self.apple_location, APPLE_CELL)
+        self.apple_spawned = True
+        return True
+
+
+    def get_snake_speed(self):
+        return DEFAULT_SNAKE_SPEED + (self.picked_apples // APPLE_SPEED_UP_INTERVAL)
+
+
+    def validate_snake_in_bounds(self):
+        return self.head_cell not in self.DEADLY_CELLS
+
+
+    def apple_is_bitten(self):
+        return self.head_cell == APPLE_CELL
+
+
+    def update_snake_head(self, direction):
+        self.head_direction = direction
+        step_x, step_y = DIRECTION_STEPS[direction]
+        self.snake_head[0] += step_x
+        self.snake_head[1] += step_y
+
+
+    def update_snake_body(self):
+        new_head = tuple(self.snake_head)
+        self.head_cell = self.grid.get(new_head)
+
+        if self.apple_is_bitten():
+            self.score += SCORE_INTERVAL
+            self.picked_apples += 1
+            self.last_apple_tick = self.ticks
+            self.apple_spawned = False
+        else:
+            tail = self.snake_body.pop()
+            self.grid.clear(tail)
+
+            # the head may follow right behind the tail
+            if tail == new_head:
+                self.head_cell = EMPTY_CELL
+
+        self.snake_body.appendleft(new_head)
+
+        if self.head_cell != OUT_OF_BOUNDS:
+            self.grid.set(new_head, BODY_CELL)
+
+
+    def step(self, direction=None):
+        if not self.alive:
+            return False
+
+        if direction in VALID_KEYS and direction != OPPOSITES[self.head_direction]:
+            self.head_direction = direction
+
+        self.play_time += 1 / self.get_snake_speed()
+        self.ticks += 1
+
+        self.update_snake_head(self.head_direction)
+        self.update_snake_body()
+
+        self.alive = self.validate_snake_in_bounds()
+
+        if self.alive:
+            self.update_apple_if_needed()
+            self.alive = not self.board_full
+
+        return self.alive
+
+
+    def is_stalled(self):
+        return self.ticks - self.last_apple_tick > self.board_x * self.board_y
+
+
+    def get_observation(self):
+        return BoardObservation(self)
+
+
+    def get_game_result(self, stop_time=None):
+        return (self.GAME_MODE, self.score, self.play_time, stop_time)
+
+
+
+class WallsEngine(StandardEngine):
+    GAME_MODE = "Walls"
+    DEADLY_CELLS = StandardEngine.DEADLY_CELLS | {WALL_CELL}
+    GRID_RUN_LENGTH = WALL_LENGTH
+
+    def reset(self):
+        self.wall = []
+        super().reset()
+
+
+    def get_wall_locations(self, wall_start, wall_dir):
+        if wall_dir == HORIZONTAL:
+            return [(wall_start[0] + i, wall_start[1]) for i in range(WALL_LENGTH)]
+        elif wall_dir == VERTICAL:
+            return [(wall_start[0], wall_start[1] + i) for i in range(WALL_LENGTH)]
+        else:
+            return []
+
+
+    def get_new_wall(self):
+        wall_dir = self.random.choice(WALL_DIRECTIONS)
+
+        for direction in (wall_dir, *(d for d in WALL_DIRECTIONS if d != wall_dir)):
+            wall_start = self.grid.get_run_start(self.random, direction)
+            if wall_start is not None:
+                return self.get_wall_locations(wall_start, direction)
+
+        return []
+
+
+    def set_new_wall(self):
+        self.grid.clear_many(self.wall)
+        self.wall = []
+
+        for _ in range(DEFAULT_WALLS):
+            new_wall = self.get_new_wall()
+            self.grid.set_many(new_wall, WALL_CELL)
+            self.wall.extend(new_wall)
+
+
+    def update_apple_if_needed(self):
+        update_needed = super().update_apple_if_needed()
+
+        if update_needed:
+            self.set_new_wall()
+
+        return update_needed
+
+
+
+class PoisonEngine(WallsEngine):
+    GAME_MODE = "Poison"
+    DEADLY_CELLS = WallsEngine.DEADLY_CELLS | {POISON_CELL}
+
+    def reset(self):
+        self.poisoned_apples = []
+        super().reset()
+
+
+    def set_poisoned_apples(self):
+        self.grid.clear_many(self.poisoned_apples)
+        self.poisoned_apples = self.grid.get_free_locations(self.random, DEFAULT_POISONED_APPLES)
+        self.grid.set_many(self.poisoned_apples, POISON_CELL)
+
+
+    def update_apple_if_needed(self):
+        update_needed = super().update_apple_if_needed()
+
+        if update_needed:
+            self.set_poisoned_apples()
+
+        return update_needed
+
+
+
+GAME_ENGINES = {engine.GAME_MODE: engine for engine in (StandardEngine, WallsEngine, PoisonEngine)}
+
+
+def play_headless_game(engine, agent):
+    agent.reset(engine.game_seed)
+
+    while engine.step(agent.get_action(engine.get_observation())) and not engine.is_stalled():
+        pass
+
+    return engine.get_game_result()
+
+
+def run_headless_games(mode, games, agent, seed=None, board_size=DEFAULT_BOARD_SIZE):
+    engine_class = GAME_ENGINES[mode]
+    results = []
+
+    engine = engine_class(board_size, seed)
+
+    for game in range(games):
+        if game:
+            engine.seed = None if seed is None else seed + game
+            engine.reset()
+
+        results.append(play_headless_game(engine, agent))
+
+    return results
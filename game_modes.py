@@ -1,94 +1,150 @@
 import pygame
 import time
-import random
 from layout_handlers import *
+from game_engine import *
+from agents import *
+from replays import *
+from frame_profiler import *
 
 
-DEFAULT_SNAKE_SPEED = 15
-DEFAULT_SNAKE_HEAD = [100, 50]
-DEFAULT_SNAKE_LENGTH = 4
-SPEED_FF_INCREASE = 2
-APPLE_SPEED_UP_INTERVAL = 3
-DEFAULT_LIVES = 3
-START_DIRECTION = pygame.K_RIGHT
-SCORE_INTERVAL = 10
-
-WALL_LENGTH = 16
-HORIZONTAL = "horizontal"
-VERTICAL = "vertical"
-WALL_DIRECTIONS = [HORIZONTAL, VERTICAL]
-
-DEFAULT_POISONED_APPLES = 3
-
-PAUSE_KEY = pygame.K_SPACE
-VALID_KEYS = [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]
-OPPOSITES = {pygame.K_UP: pygame.K_DOWN, 
-    pygame.K_DOWN: pygame.K_UP, 
-    pygame.K_LEFT: pygame.K_RIGHT, 
-    pygame.K_RIGHT: pygame.K_LEFT, 
-}
+DISPLAY_FPS = 60
+MAX_ACCUMULATED_TIME = 0.25
+CAMERA_MARGIN = 8
 
+CELL_COLORS = {EMPTY_CELL: SNAKE_BLACK,
+    BODY_CELL: SNAKE_GREEN,
+    WALL_CELL: SNAKE_ORANGE,
+    POISON_CELL: SNAKE_BLUE,
+    APPLE_CELL: SNAKE_WHITE,
+}
 
 class SnakeStandard:
-    GAME_MODE = "Standard"
+    ENGINE = StandardEngine
+    GAME_MODE = ENGINE.GAME_MODE
 
-    def __init__(self, game_window):
-        print("Snake Standard initialized")
+    def __init__(self, game_window, seed=None, dirty_rects=True, profiler=None, interpolate=False, board_size=None):
+        print(f"Snake {self.GAME_MODE} initialized")
         self.game_window = game_window
-        self.loHandler = SnakeLayoutHandler(self.game_window)
+        self.dirty_rects = dirty_rects
+        self.redraw_all = True
+        self.loHandler = SnakeLayoutHandler(self.game_window, self.dirty_rects)
         self.game_surface = self.loHandler.get_game_surface()
         self.window_x, self.window_y = self.game_surface.get_size()
-        self.init_game_variables()
+        self.view_x, self.view_y = self.window_x // PIXEL_SIZE, self.window_y // PIXEL_SIZE
+        self.engine = self.ENGINE(board_size or (self.view_x, self.view_y), seed)
+        self.engine.grid.track_changes = self.dirty_rects
+        self.profiler = profiler or NoFrameProfiler()
+        self.interpolate = interpolate
+
+        # boards bigger than the window are shown through a camera following the head
+        self.scrolling = self.engine.board_x > self.view_x or self.engine.board_y > self.view_y
+        self.camera = [0, 0]
+        self.board_pixels = (min(self.engine.board_x, self.view_x) * PIXEL_SIZE, min(self.engine.board_y, self.view_y) * PIXEL_SIZE)
+
 
-    
-    def init_game_variables(self):
-        self.head_direction = START_DIRECTION
-        self.picked_apples = 0
-        self.score = 0
-        self.apple_spawned = False
-        self.apple_location = []
-        self.snake_head = DEFAULT_SNAKE_HEAD.copy()
-        self.snake_body = [[self.snake_head[0] - (i * PIXEL_SIZE), self.snake_head[1]] for i in range(DEFAULT_SNAKE_LENGTH)]
-        self.occupied_locations = [self.snake_body, self.apple_location]
+    def to_pixels(self, locations):
+        camera_x, camera_y = self.camera
+        return [[(x - camera_x) * PIXEL_SIZE, (y - camera_y) * PIXEL_SIZE] for x, y in locations]
 
 
-    def location_is_occupied(self, locations):
-        #return any(self.game_surface.get_at(loc) != SNAKE_BLACK for loc in locations)
-        return any(loc in occupied for loc in locations for occupied in self.occupied_locations)
+    def in_view(self, location):
+        return 0 <= location[0] - self.camera[0] < self.view_x and 0 <= location[1] - self.camera[1] < self.view_y
 
 
-    def get_new_location(self, xy_limits):
-        limit_x, limit_y = xy_limits
-        x_location = random.randrange(1, (self.window_x // PIXEL_SIZE) - limit_x) * PIXEL_SIZE
-        y_location = random.randrange(1, (self.window_y // PIXEL_SIZE) - limit_y) * PIXEL_SIZE
-        new_location = [x_location, y_location]
-        return new_location if not self.location_is_occupied([new_location]) else self.get_new_location(xy_limits)
+    def follow_head(self):
+        moved = False
 
+        for axis, view, board in ((0, self.view_x, self.engine.board_x), (1, self.view_y, self.engine.board_y)):
+            head = self.engine.snake_head[axis]
+            if CAMERA_MARGIN <= head - self.camera[axis] < view - CAMERA_MARGIN:
+                continue
 
-    def update_apple_if_needed(self):
-        if self.apple_spawned:
-            return False
+            camera = min(max(head - view // 2, 0), max(board - view, 0))
+            moved = moved or camera != self.camera[axis]
+            self.camera[axis] = camera
 
-        self.apple_location = self.get_new_location((0, 0))
-        self.apple_spawned = True
-        return True
+        return moved
 
 
     def add_new_window_contents(self):
+        if self.scrolling and self.follow_head():
+            self.redraw_all = True
+
+        if self.redraw_all or not self.dirty_rects:
+            self.engine.grid.pop_changed_cells()
+            if self.scrolling:
+                self.add_view_contents()
+            else:
+                self.add_all_window_contents()
+            self.redraw_all = False
+        else:
+            self.add_changed_window_contents()
+
+
+    def clear_board(self):
         self.loHandler.clear_game_surface()
 
-        self.loHandler.add_snake_to_game_surface(self.snake_body, self.head_direction, SNAKE_GREEN, PIXEL_SIZE)
-        self.loHandler.add_blocks_game_surface([self.apple_location], SNAKE_WHITE, PIXEL_SIZE)
+        if self.board_pixels != (self.window_x, self.window_y):
+            self.loHandler.fill_outside_board(*self.board_pixels, SNAKE_GREY)
+
+
+    def add_view_contents(self):
+        # only the chunks under the camera are visited, whatever the board size
+        self.clear_board()
+        camera_x, camera_y = self.camera
+
+        for location, cell in self.engine.grid.iter_cells(camera_x, camera_y, camera_x + self.view_x, camera_y + self.view_y):
+            self.loHandler.add_blocks_game_surface(self.to_pixels([location]), CELL_COLORS[cell], PIXEL_SIZE)
+
+        self.loHandler.add_snake_head_to_game_surface(self.to_pixels([self.engine.snake_body[0]])[0], self.engine.head_direction, SNAKE_GREEN, PIXEL_SIZE)
+
+
+    def add_changed_window_contents(self):
+        grid = self.engine.grid
+
+        for location in grid.pop_changed_cells():
+            if self.in_view(location):
+                self.loHandler.add_blocks_game_surface(self.to_pixels([location]), CELL_COLORS[grid.get(location)], PIXEL_SIZE)
+
+        head, neck = self.to_pixels([self.engine.snake_body[0], self.engine.snake_body[1]])
+        self.loHandler.add_blocks_game_surface([neck], SNAKE_GREEN, PIXEL_SIZE)
+        self.loHandler.add_snake_head_to_game_surface(head, self.engine.head_direction, SNAKE_GREEN, PIXEL_SIZE)
+
+
+    def add_all_window_contents(self):
+        self.clear_board()
+
+        self.loHandler.add_snake_to_game_surface(self.to_pixels(self.engine.snake_body), self.engine.head_direction, SNAKE_GREEN, PIXEL_SIZE)
+        self.loHandler.add_blocks_game_surface(self.to_pixels([self.engine.apple_location]), SNAKE_WHITE, PIXEL_SIZE)
+
+
+    def add_head_overlay(self, progress):
+        # the part of the next cell the head has already moved into
+        head_x, head_y = self.to_pixels([self.engine.snake_head])[0]
+        step_x, step_y = DIRECTION_STEPS[self.engine.head_direction]
+        length = int(PIXEL_SIZE * progress)
+
+        if step_x:
+            overlay = (head_x + PIXEL_SIZE if step_x > 0 else head_x - length, head_y, length, PIXEL_SIZE)
+        else:
+            overlay = (head_x, head_y + PIXEL_SIZE if step_y > 0 else head_y - length, PIXEL_SIZE, length)
+
+        self.loHandler.set_head_overlay(overlay, SNAKE_GREEN)
 
 
     def get_updated_info_fields(self, speed, time):
-        return [
-            f"SCORE: {self.score}", 
-            f"MODE: {self.GAME_MODE}", 
-            f"SPEED: {speed}", 
-            f"TIME: {int(time)} s", 
+        info_fields = [
+            f"SCORE: {self.engine.score}",
+            f"MODE: {self.GAME_MODE}",
+            f"SPEED: {speed}",
+            f"TIME: {int(time)} s",
         ]
 
+        if self.profiler.hud:
+            info_fields.append(self.profiler.get_hud_text())
+
+        return info_fields
+
 
     def update_score(self, speed, time):
         updated_info = self.get_updated_info_fields(speed, time)
@@ -96,197 +152,140 @@ class SnakeStandard:
 
 
     def game_over(self):
-        self.loHandler.set_middle_screen_text(f"GAME OVER! Score: {self.score}", SNAKE_RED)
+        if self.engine.board_full:
+            self.loHandler.set_middle_screen_text(f"BOARD FULL! Score: {self.engine.score}", SNAKE_GREEN)
+        else:
+            self.loHandler.set_middle_screen_text(f"GAME OVER! Score: {self.engine.score}", SNAKE_RED)
 
 
     def set_pause_screen(self):
         self.loHandler.set_middle_screen_text("GAME IS PAUSED", SNAKE_WHITE)
 
 
-    def validate_snake_in_bounds(self):
-        valid_snake = True
-
-        if self.snake_head[0] < 0 or self.snake_head[0] > self.window_x - PIXEL_SIZE:
-            valid_snake = False
-        
-        if self.snake_head[1] < 0 or self.snake_head[1] > self.window_y - PIXEL_SIZE:
-            valid_snake = False
-        
-        if self.snake_head in self.snake_body[1::]:
-            valid_snake = False
-
-        return valid_snake
-
-
-    def apple_is_bitten(self):
-        return self.snake_head[0] == self.apple_location[0] and self.snake_head[1] == self.apple_location[1]
-
+    def toggle_pause_screen(self, paused):
+        if paused:
+            self.set_pause_screen()
+        else:
+            self.redraw_all = True
 
-    def update_snake_head(self, direction):
-        self.head_direction = direction
 
-        if direction == pygame.K_UP:
-            self.snake_head[1] -= PIXEL_SIZE
-        if direction == pygame.K_DOWN:
-            self.snake_head[1] += PIXEL_SIZE
-        if direction == pygame.K_LEFT:
-            self.snake_head[0] -= PIXEL_SIZE
-        if direction == pygame.K_RIGHT:
-            self.snake_head[0] += PIXEL_SIZE
+    def step_game(self, agent, replay):
+        change_to = agent.get_action(self.engine.get_observation())
+        self.profiler.mark("agent")
 
+        replay.record_direction(self.engine.ticks, change_to)
+        playing = self.engine.step(change_to) and not agent.is_finished(self.engine.ticks)
+        self.profiler.mark("logic")
 
-    def update_snake_body(self):
-        self.snake_body.insert(0, list(self.snake_head))
-        
-        if self.apple_is_bitten():
-            self.score += SCORE_INTERVAL
-            self.picked_apples += 1
-            self.apple_spawned = False
-        else:
-            self.snake_body.pop()
+        return playing
 
 
-    def run_game(self):
-        self.init_game_variables()
-        self.update_apple_if_needed()
-        direction = change_to = self.head_direction
+    def run_game(self, agent=None, speed_factor=1, record_replay=True):
+        agent = agent or KeyboardAgent()
+        self.engine.reset()
+        agent.reset(self.engine.game_seed)
+        replay = Replay(self.GAME_MODE, (self.engine.board_x, self.engine.board_y), self.engine.game_seed)
+        self.camera = [0, 0]
+        self.redraw_all = True
         playing, paused = True, False
+        accumulated_time = 0
         fps = pygame.time.Clock()
         start_time = time.time()
 
+        # input and drawing run at the display rate, the snake moves whenever a whole tick has accumulated
         while playing:
-            snake_speed = DEFAULT_SNAKE_SPEED + (self.picked_apples // APPLE_SPEED_UP_INTERVAL)
+            self.profiler.start_frame(1 / DISPLAY_FPS)
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     GameInterface.quit()
-                    
-                if event.type == pygame.KEYDOWN and event.key in VALID_KEYS and not paused:
-                    change_to = event.key
+
+                if not paused:
+                    agent.handle_event(event)
                 if event.type == pygame.KEYDOWN and event.key == PAUSE_KEY:
                     paused = not paused
-           
-            if paused:
-                self.set_pause_screen()
-            else:
-                if change_to == direction and pygame.key.get_pressed()[direction]:
-                    snake_speed *= SPEED_FF_INCREASE
-                
-                if direction != OPPOSITES[change_to]:
-                    direction = change_to
-                
-                self.update_snake_head(direction)
-                self.update_snake_body()
-                
-                valid_snake = self.validate_snake_in_bounds()
-
-                if valid_snake:
-                    self.update_apple_if_needed()
-                    self.add_new_window_contents()
-                else:
-                    self.game_over()
+                    replay.record_pause(self.engine.ticks)
+                    self.toggle_pause_screen(paused)
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE and not agent.HUMAN:
                     playing = False
 
-            self.update_score(0 if paused else snake_speed, time.time() - start_time)
-
-            self.loHandler.update_game_window()
-            fps.tick(snake_speed)
-        
-        stop_time = time.time()
-        play_time = stop_time - start_time
-        time.sleep(2)
-
-        return (self.GAME_MODE, self.score, play_time, stop_time)
+            self.profiler.mark("input")
 
+            snake_speed = self.engine.get_snake_speed()
 
+            if not paused and playing:
+                if agent.is_fast_forward(self.engine.head_direction):
+                    snake_speed *= SPEED_FF_INCREASE
 
-class SnakeMedium(SnakeStandard):
-    GAME_MODE = "Walls"
-    
-    def __init__(self, game_window):
-        print("Snake Medium initialized")
-        super().__init__(game_window)
-        self.wall = []
-        self.occupied_locations.append(self.wall)
-
-
-    def set_new_wall(self):
-        wall_dir = random.choice(WALL_DIRECTIONS)
-        wall_start = self.get_new_location((WALL_LENGTH, 0) if wall_dir == HORIZONTAL else (0, WALL_LENGTH))
-
-        if wall_dir == HORIZONTAL:
-            self.wall = [[wall_start[0] + (i * PIXEL_SIZE), wall_start[1]] for i in range(WALL_LENGTH)]
-        elif wall_dir == VERTICAL:
-            self.wall = [[wall_start[0], wall_start[1] + (i * PIXEL_SIZE)] for i in range(WALL_LENGTH)]
-        else:
-            self.wall = []
+                tick_interval = 1 / (snake_speed * speed_factor)
+                ticked = False
 
-        if super().location_is_occupied(self.wall):
-            return self.set_new_wall()
+                while playing and accumulated_time >= tick_interval:
+                    accumulated_time -= tick_interval
+                    playing = self.step_game(agent, replay)
+                    ticked = True
 
+                if playing and (ticked or self.redraw_all):
+                    self.add_new_window_contents()
+                if playing and self.interpolate:
+                    self.add_head_overlay(accumulated_time / tick_interval)
 
-    def validate_snake_in_bounds(self):
-        valid_snake = super().validate_snake_in_bounds()
+            if not playing:
+                self.game_over()
 
-        if self.snake_head in self.wall:
-            valid_snake = False
+            self.profiler.mark("draw")
+            self.update_score(0 if paused else snake_speed, time.time() - start_time)
+            self.profiler.mark("info")
 
-        return valid_snake
+            self.loHandler.update_game_window()
+            self.profiler.mark("display")
+            self.profiler.end_frame()
+            frame_time = fps.tick(DISPLAY_FPS) / 1000
 
+            # a stalled frame drops the backlog instead of replaying it in a burst
+            if not paused:
+                accumulated_time = min(accumulated_time + frame_time, MAX_ACCUMULATED_TIME)
 
-    def update_apple_if_needed(self):
-        update_needed = super().update_apple_if_needed()
-        
-        if update_needed:
-            self.set_new_wall()
-        
-        return update_needed
+        stop_time = time.time()
+        play_time = stop_time - start_time
 
+        self.profiler.end_game(self.GAME_MODE)
 
-    def add_new_window_contents(self):
-        super().add_new_window_contents()
-        self.loHandler.add_blocks_game_surface(self.wall, SNAKE_ORANGE, PIXEL_SIZE)
+        if record_replay:
+            replay.end_tick = self.engine.ticks
+            replay.save(get_replay_path(self.GAME_MODE, stop_time))
 
+        time.sleep(2)
 
+        return (self.GAME_MODE, self.engine.score, play_time, stop_time)
 
-class SnakeHard(SnakeMedium):
-    GAME_MODE = "Poison"
 
-    def __init__(self, game_window):
-        print("SPAWNING THE HARD VERSION!")
-        super().__init__(game_window)
-        self.poisoned_apples = []
-        self.occupied_locations.append(self.poisoned_apples)
 
-    
-    def set_poisoned_apples(self):
-        self.poisoned_apples = [self.get_new_location((0, 0)) for _ in range(DEFAULT_POISONED_APPLES)]
+class SnakeMedium(SnakeStandard):
+    ENGINE = WallsEngine
+    GAME_MODE = ENGINE.GAME_MODE
 
+    def add_all_window_contents(self):
+        super().add_all_window_contents()
+        self.loHandler.add_blocks_game_surface(self.to_pixels(self.engine.wall), SNAKE_ORANGE, PIXEL_SIZE)
 
-    def validate_snake_in_bounds(self):
-        valid_snake = super().validate_snake_in_bounds()
 
-        if self.snake_head in self.poisoned_apples:
-            valid_snake = False
 
-        return valid_snake
+class SnakeHard(SnakeMedium):
+    ENGINE = PoisonEngine
+    GAME_MODE = ENGINE.GAME_MODE
 
-    def update_apple_if_needed(self):
-        update_needed = super().update_apple_if_needed()
+    def add_all_window_contents(self):
+        super().add_all_window_contents()
+        self.loHandler.add_blocks_game_surface(self.to_pixels(self.engine.poisoned_apples), SNAKE_BLUE, PIXEL_SIZE)
 
-        if update_needed:
-            self.set_poisoned_apples()
-        
-        return update_needed
 
 
-    def add_new_window_contents(self):
-        super().add_new_window_contents()
-        self.loHandler.add_blocks_game_surface(self.poisoned_apples, SNAKE_BLUE, PIXEL_SIZE)
+class SnakeExtreme(SnakeHard):
+    pass
 
 
 
-class SnakeExtreme(SnakeHard):
-    pass
+GAME_MODES = {game_mode.GAME_MODE: game_mode for game_mode in (SnakeStandard, SnakeMedium, SnakeHard)}
 
 
@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import json
+import time
+import pygame
+from game_engine import *
+from agents import AGENTS, KeyboardAgent
+
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 7715
+MAX_SESSION_CELLS = CHUNKED_GRID_CELLS
+MAX_TICK_BACKLOG = 0.25
+PLAYER_NAME_LENGTH = 5
+STATS_INTERVAL = 10
+
+DIRECTION_NAMES = {"up": pygame.K_UP,
+    "down": pygame.K_DOWN,
+    "left": pygame.K_LEFT,
+    "right": pygame.K_RIGHT,
+}
+DIRECTION_KEYS = {key: name for name, key in DIRECTION_NAMES.items()}
+
+
+def encode_message(message):
+    # one JSON object per line, both ways
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def get_cell_list(grid, locations):
+    return [[x, y, grid.get((x, y))] for x, y in locations]
+
+
+
+class GameSession:
+
+    def __init__(self, mode, board_size=DEFAULT_BOARD_SIZE, seed=None, player=None, agent=None):
+        self.engine = GAME_ENGINES[mode](board_size, seed)
+        self.engine.grid.track_changes = True
+        self.player = player
+        self.agent = agent or KeyboardAgent()
+        self.agent.reset(self.engine.game_seed)
+        self.resumed = asyncio.Event()
+        self.resumed.set()
+
+
+    def turn(self, direction):
+        # the keyboard agent queues the turn exactly like a local key press
+        self.agent.handle_event(pygame.event.Event(pygame.KEYDOWN, key=direction))
+
+
+    def toggle_pause(self):
+        if self.resumed.is_set():
+            self.resumed.clear()
+        else:
+            self.resumed.set()
+
+        return not self.resumed.is_set()
+
+
+    def get_state(self):
+        engine = self.engine
+        return {
+            "ticks": engine.ticks,
+            "head": engine.snake_body[0],
+            "direction": DIRECTION_KEYS[engine.head_direction],
+            "score": engine.score,
+            "speed": engine.get_snake_speed(),
+            "time": engine.play_time,
+        }
+
+
+    def get_start_message(self):
+        engine = self.engine
+        cells = [[x, y, cell] for (x, y), cell in engine.grid.iter_cells(0, 0, engine.board_x, engine.board_y)]
+        engine.grid.pop_changed_cells()
+
+        return {"type": "start", "mode": engine.GAME_MODE, "board_size": [engine.board_x, engine.board_y], "seed": engine.game_seed, "cells": cells, **self.get_state()}
+
+
+    def get_tick_message(self, playing):
+        return {"type": "tick", "playing": playing, "cells": get_cell_list(self.engine.grid, self.engine.grid.pop_changed_cells()), **self.get_state()}
+
+
+    def get_over_message(self):
+        return {"type": "over", "score": self.engine.score, "board_full": self.engine.board_full}
+
+
+    def step(self):
+        engine = self.engine
+        playing = engine.step(self.agent.get_action(engine.get_observation())) and not self.agent.is_finished(engine.ticks)
+
+        # nobody is watching an agent that circles forever
+        return playing and (self.agent.HUMAN or not engine.is_stalled())
+
+
+    async def play(self, send=None, on_tick=None):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+
+        if send:
+            await send(self.get_start_message())
+
+        playing = True
+        while playing:
+            # deadlines follow the snake speed without drifting, a stalled loop drops the backlog
+            next_tick += 1 / self.engine.get_snake_speed()
+            now = loop.time()
+            if now - next_tick > MAX_TICK_BACKLOG:
+                next_tick = now
+            await asyncio.sleep(next_tick - now)
+
+            # a pause that arrived during the sleep holds back this tick as well
+            if not self.resumed.is_set():
+                await self.resumed.wait()
+                next_tick = loop.time()
+                continue
+
+            playing = self.step()
+            if on_tick:
+                on_tick(loop.time() - next_tick)
+            if send:
+                await send(self.get_tick_message(playing))
+
+        if send:
+            await send(self.get_over_message())
+
+        return self.engine.get_game_result(time.time())
+
+
+
+class GameServer:
+
+    def __init__(self, dbHandler=None, board_size=DEFAULT_BOARD_SIZE):
+        self.dbHandler = dbHandler
+        self.board_size = board_size
+        self.sessions = 0
+        self.games_played = 0
+        self.reset_stats()
+
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.max_lag = 0
+        self.stats_time = time.perf_counter()
+
+
+    def record_tick(self, lag):
+        self.ticks += 1
+        self.max_lag = max(self.max_lag, lag)
+
+
+    def print_stats(self):
+        interval = time.perf_counter() - self.stats_time
+        print(f"{self.sessions} sessions, {self.games_played} games played, {self.ticks / interval:.0f} ticks/s, max tick lag {self.max_lag * 1000:.1f} ms")
+        self.reset_stats()
+
+
+    def create_session(self, message):
+        mode = message.get("mode", "Standard")
+        if mode not in GAME_ENGINES:
+            raise ValueError(f"unknown mode {mode}")
+
+        board_x, board_y = message.get("board_size", self.board_size)
+        if not (is_valid_board_size((board_x, board_y)) and board_x * board_y <= MAX_SESSION_CELLS):
+            raise ValueError(f"board size {board_x}x{board_y} is not supported")
+
+        player = str(message.get("player", ""))[:PLAYER_NAME_LENGTH]
+        return GameSession(mode, (board_x, board_y), message.get("seed"), player or None)
+
+
+    async def play_session(self, session, send=None):
+        self.sessions += 1
+
+        try:
+            game_result = await session.play(send, self.record_tick)
+        except ConnectionError:
+            return None
+        finally:
+            self.sessions -= 1
+
+        self.games_played += 1
+
+        # the database writer thread does the disk work, the event loop only queues the row
+        if self.dbHandler and session.player:
+            self.dbHandler.set_score(session.player, *game_result)
+
+        return game_result
+
+
+    def handle_command(self, session, command, message):
+        if command == "turn":
+            direction = message.get("direction")
+            if not isinstance(direction, str) or direction not in DIRECTION_NAMES:
+                return {"type": "error", "message": f"invalid direction {direction}"}
+            session.turn(DIRECTION_NAMES[direction])
+        elif command == "pause":
+            return {"type": "pause", "paused": session.toggle_pause()}
+        else:
+            return {"type": "error", "message": f"unknown command {command}"}
+
+
+    async def handle_client(self, reader, writer):
+        session, game = None, None
+
+        async def send(message):
+            writer.write(encode_message(message))
+            await writer.drain()
+
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                    command = message["type"]
+                except (ValueError, TypeError, KeyError):
+                    await send({"type": "error", "message": "messages are single JSON objects with a type"})
+                    continue
+
+                reply = None
+                if command == "quit":
+                    break
+                elif command == "start":
+                    if game and not game.done():
+                        reply = {"type": "error", "message": "a game is already running"}
+                    else:
+                        try:
+                            session = self.create_session(message)
+                            game = asyncio.create_task(self.play_session(session, send))
+                        except (ValueError, TypeError) as error:
+                            reply = {"type": "error", "message": str(error)}
+                elif session:
+                    reply = self.handle_command(session, command, message)
+                else:
+                    reply = {"type": "error", "message": "no game started"}
+
+                if reply:
+                    await send(reply)
+        except ConnectionError:
+            pass
+        finally:
+            # a game left behind by its player is not scored
+            if game:
+                game.cancel()
+            writer.close()
+
+
+    async def run_bot(self, agent_name, mode, save=False):
+        # load testing games stay off the high scores unless asked for
+        player = agent_name if save else None
+
+        while True:
+            session = GameSession(mode, self.board_size, player=player, agent=AGENTS[agent_name]())
+            await self.play_session(session)
+
+
+    async def report_stats(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            self.print_stats()
+
+
+    async def serve(self, host=SERVER_HOST, port=SERVER_PORT, unix_path=None, bots=0, bot_agent="Greedy", bot_mode="Standard", save_bots=False):
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_client, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+
+        print(f"Serving snake games on {unix_path or f'{host}:{port}'}")
+        background_tasks = [asyncio.create_task(self.run_bot(bot_agent, bot_mode, save_bots)) for _ in range(bots)]
+        background_tasks.append(asyncio.create_task(self.report_stats()))
+
+        async with server:
+            await server.serve_forever()
+
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Host many snake games at once for network clients.")
+    parser.add_argument("--host", default=SERVER_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="TCP port to listen on")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--bots", type=int, default=0, help="agent sessions to host next to the network players, for load testing")
+    parser.add_argument("--agent", choices=list(AGENTS), default="Greedy", help="agent playing the bot sessions")
+    parser.add_argument("--mode", choices=list(GAME_ENGINES), default="Standard", help="game mode of the bot sessions")
+    parser.add_argument("--save-bots", action="store_true", help="store finished bot games in the score database under the agent's name")
+    parser.add_argument("--no-save", action="store_true", help="don't store finished games in the score database")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    dbHandler = None
+
+    if not args.no_save:
+        from db_handlers import DatabaseHandler
+        dbHandler = DatabaseHandler(write_behind=True)
+
+    try:
+        asyncio.run(GameServer(dbHandler).serve(args.host, args.port, args.unix, args.bots, args.agent, args.mode, args.save_bots))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if dbHandler:
+            dbHandler.close()
@@ -1,12 +1,25 @@
 import pygame
-import time
 from layout_handlers import *
 from game_modes import *
 
 
+REDRAW_EVENTS = {pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED}
+IDLE_WAIT = 100
+
+
+def wait_for_events(timeout=IDLE_WAIT):
+    # pygame.event.wait polls SDL every millisecond, so an idle screen sleeps between checks itself
+    events = pygame.event.get()
+    if not events:
+        pygame.time.wait(min(timeout, IDLE_WAIT))
+        events = pygame.event.get()
+
+    return events
+
+
+
 class NameInputHandler:
     PLAYER_NAME_LENGTH = 5
-    INPUT_FPS_TICK = 10
 
     def __init__(self, game_window):
         self.game_window = game_window
@@ -15,14 +28,22 @@ class NameInputHandler:
 
     
     def run_main_loop(self):
-        fps = pygame.time.Clock()
         complete_name = False
+        shown_screen = None
 
         while not complete_name:
-            for event in pygame.event.get():
+            screen = (len(self.player), "".join(self.player), self.loHandler.is_blink_hidden())
+            if screen != shown_screen:
+                self.loHandler.update_screen(self.player)
+                shown_screen = screen
+
+            for event in wait_for_events(self.loHandler.get_blink_timeout()):
                 if event.type == pygame.QUIT:
                     GameInterface.quit()
 
+                if event.type in REDRAW_EVENTS:
+                    shown_screen = None
+
                 if event.type == pygame.KEYDOWN:
                     key = event.unicode
                     if key.isalpha() and len(self.player) < 5:
@@ -32,9 +53,6 @@ class NameInputHandler:
                     if event.key == pygame.K_RETURN and len(self.player) == self.PLAYER_NAME_LENGTH:
                         #print("".join(self.player))
                         complete_name = True
-            
-            self.loHandler.update_screen(self.player)
-            fps.tick(self.INPUT_FPS_TICK)
         
         return "".join(self.player)
 
@@ -42,34 +60,61 @@ class NameInputHandler:
 
 class MainMenuInputHandler:
 
-    def __init__(self, game_window, dbHandler):
+    def __init__(self, game_window, dbHandler, game_options=None):
         self.game_window = game_window
         self.dbHandler = dbHandler
-        self.init_menu_layout_handler()
+        self.game_options = game_options or {}
+        self.menuLoHandler = None
+        self.screens = {}
+
+
+    def get_screen(self, key, create_screen):
+        # screens are built the first time they're opened and reused after that
+        if key not in self.screens:
+            self.screens[key] = create_screen()
+
+        return self.screens[key]
+
+
+    def get_game_mode(self, game_mode):
+        return self.get_screen(game_mode, lambda: game_mode(self.game_window, **self.game_options))
 
     
     def init_menu_layout_handler(self):
         self.MENU_ITEMS = [
-            {"label": "Instructions", "action": lambda: InstructionInputHandler(self.game_window).main_loop(), },
-            {"label": "Standard Mode", "action": lambda: SnakeStandard(self.game_window).run_game(), },
-            {"label": "Walls Mode", "action": lambda: SnakeMedium(self.game_window).run_game(), },
-            {"label": "Poison Mode", "action": lambda: SnakeHard(self.game_window).run_game(), },
-            {"label": "High Scores", "action": lambda: HighScoreInputHandler(self.game_window, self.dbHandler).run(), },
+            {"label": "Instructions", "action": lambda: self.get_screen("Instructions", lambda: InstructionInputHandler(self.game_window)).main_loop(), },
+            {"label": "Standard Mode", "action": lambda: self.get_game_mode(SnakeStandard).run_game(), },
+            {"label": "Walls Mode", "action": lambda: self.get_game_mode(SnakeMedium).run_game(), },
+            {"label": "Poison Mode", "action": lambda: self.get_game_mode(SnakeHard).run_game(), },
+            {"label": "Watch Agents", "action": lambda: self.get_screen("Watch Agents", lambda: AgentInputHandler(self.game_window, self.dbHandler, self.game_options)).run(), },
+            {"label": "High Scores", "action": lambda: self.get_screen("High Scores", lambda: HighScoreInputHandler(self.game_window, self.dbHandler)).run(), },
         ]
 
         self.menuLoHandler = MenuLayoutHandler(self.game_window, [item["label"] for item in self.MENU_ITEMS])
 
 
-    def run(self):
-        menu_index = 0
+    def run(self, on_first_frame=None):
+        if not self.menuLoHandler:
+            self.init_menu_layout_handler()
+
+        menu_index = self.menuLoHandler.menu_index
         interested = True
-        fps = pygame.time.Clock()
+        self.menuLoHandler.redraw_menu()
 
         while interested:
-            for event in pygame.event.get():
+            self.menuLoHandler.update_menu_surface()
+
+            if on_first_frame:
+                on_first_frame()
+                on_first_frame = None
+
+            for event in wait_for_events():
                 if event.type == pygame.QUIT:
                     GameInterface.quit()
 
+                if event.type in REDRAW_EVENTS:
+                    self.menuLoHandler.redraw_menu()
+
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
                         interested = False
@@ -86,10 +131,10 @@ class MainMenuInputHandler:
                             player_name = nameHandler.run_main_loop()
                             self.dbHandler.set_score(player_name, *game_result)
 
-                    self.menuLoHandler.move_menu_selector(menu_index)
+                        # the action drew its own screens over the menu
+                        self.menuLoHandler.redraw_menu()
 
-            self.menuLoHandler.update_menu_surface()
-            fps.tick(MAIN_VIEW_FPS)
+                    self.menuLoHandler.move_menu_selector(menu_index)
         
         
 
@@ -107,58 +152,57 @@ class HighScoreInputHandler(MainMenuInputHandler):
 
 
     def get_score_portion(self, start, amount):
-        return self.scores[start:start + amount]
+        return self.scores.get_window(start, amount)
 
 
     def get_db_totals(self, mode):
-        db_totals = self.dbHandler.get_totals(mode)
-        
-        if None in db_totals:
+        score_stats = self.dbHandler.get_score_stats(mode)
+
+        if not score_stats:
             return [0 for _ in range(6)]
 
-        totals = list(db_totals[:-2])
+        totals = list(score_stats[:5])
         totals[4] = f"{totals[4]:.2f}"
+        totals.append(score_stats[-1])
 
-        start_date_ts = db_totals[-2]
-        end_date_ts = db_totals[-1]
-
-        all_dates = self.dbHandler.get_all_dates()
-        unique_days = {time.localtime(date)[:3] for date, *_ in all_dates}
-
-        totals.append(len(unique_days))
         return totals
 
 
     def score_display_loop(self, mode):
         browsing = True
-        self.scores = self.dbHandler.get_mode_scores(mode)
-        totals = self.get_db_totals(mode)
         start_index, num_scores = 0, self.scoreDispHandl.DEFAULT_SCORES_DISP
+        self.dbHandler.flush_scores()
+        self.scores = self.dbHandler.get_score_pager(mode, num_scores)
+        totals = self.get_db_totals(mode)
         scores_to_display = self.get_score_portion(start_index, num_scores)
+        redraw = True
 
-        fps = pygame.time.Clock()
         while browsing:
-            for event in pygame.event.get():
+            if redraw:
+                self.scoreDispHandl.list_scores(scores_to_display, start_index, totals)
+                redraw = False
+
+            for event in wait_for_events():
                 if event.type == pygame.QUIT:
                     GameInterface.quit()
 
+                if event.type in REDRAW_EVENTS:
+                    redraw = True
+
                 if event.type == pygame.KEYDOWN:
                     match event.key:
                         case pygame.K_UP:
                             if start_index > 0:
                                 start_index -= 1
                                 scores_to_display = self.get_score_portion(start_index, num_scores)
+                                redraw = True
                         case pygame.K_DOWN:
                             if start_index < (len(self.scores) - num_scores):
                                 start_index += 1
                                 scores_to_display = self.get_score_portion(start_index, num_scores)
+                                redraw = True
                         case _:
                             browsing = False
-            if scores_to_display or not self.scores:
-                self.scoreDispHandl.list_scores(scores_to_display, start_index, totals)
-                scores_to_display = []
-
-            fps.tick(MAIN_VIEW_FPS)
 
 
     def init_menu_layout_handler(self):
@@ -174,6 +218,22 @@ class HighScoreInputHandler(MainMenuInputHandler):
 
 
 
+class AgentInputHandler(MainMenuInputHandler):
+
+    def watch_agent(self, agent, game_mode):
+        self.get_game_mode(game_mode).run_game(agent(), record_replay=False)
+
+
+    def init_menu_layout_handler(self):
+        self.MENU_ITEMS = [
+            {"label": f"{agent.NAME} - {game_mode.GAME_MODE}", "action": lambda agent=agent, game_mode=game_mode: self.watch_agent(agent, game_mode), }
+            for agent in AGENTS.values() for game_mode in GAME_MODES.values()
+        ]
+
+        self.menuLoHandler = MenuLayoutHandler(self.game_window, [item["label"] for item in self.MENU_ITEMS])
+
+
+
 class InstructionInputHandler:
 
     def __init__(self, game_window):
@@ -182,17 +242,22 @@ class InstructionInputHandler:
 
 
     def main_loop(self):
-        fps = pygame.time.Clock()
         done = False
-        index = 0
-
-        self.loHandler.update_view(index)
+        index, shown_index = 0, None
+        self.loHandler.refresh()
                 
         while not done:
-            for event in pygame.event.get():
+            if index != shown_index:
+                self.loHandler.update_view(index)
+                shown_index = index
+
+            for event in wait_for_events():
                 if event.type == pygame.QUIT:
                     GameInterface.quit()
 
+                if event.type in REDRAW_EVENTS:
+                    shown_index = None
+
                 if event.type == pygame.KEYDOWN:
                     match event.key:
                         case pygame.K_UP:
@@ -202,9 +267,5 @@ class InstructionInputHandler:
                         case _:
                             if event.key != pygame.K_LEFT and event.key != pygame.K_RIGHT:
                                 done = True
-                    
-                    self.loHandler.update_view(index)
-            
-            fps.tick(MAIN_VIEW_FPS)
 
 
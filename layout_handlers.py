@@ -1,9 +1,11 @@
+import json
+import os
 import pygame
 import random
 import time
 import xml.etree.ElementTree as ET
+from functools import cache, lru_cache
 
-MAIN_VIEW_FPS = 10
 PIXEL_SIZE = 10
 
 SNAKE_BLACK = pygame.Color(0, 0, 0)
@@ -12,6 +14,7 @@ SNAKE_RED = pygame.Color(255, 0, 0)
 SNAKE_GREEN = pygame.Color(0, 255, 0)
 SNAKE_BLUE = pygame.Color(0, 0, 255)
 SNAKE_ORANGE = pygame.Color(255, 153, 51)
+SNAKE_GREY = pygame.Color(64, 64, 64)
 
 GAME_FONT = "times new roman"
 SCORE_FONT_SIZE = 20
@@ -22,10 +25,71 @@ MIDDLE_SCREEN_FONT_SIZE = 50
 
 INFO_SURFACE_HEIGHT = 30
 
+TEXT_CACHE_SIZE = 512
+FONT_CACHE_FILE = "font_cache.json"
+
+
+@cache
+def load_font_paths():
+    try:
+        with open(FONT_CACHE_FILE) as font_file:
+            return json.load(font_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_font_paths(font_paths):
+    try:
+        with open(FONT_CACHE_FILE, "w") as font_file:
+            json.dump(font_paths, font_file, indent=2)
+    except OSError:
+        pass
+
+
+@cache
+def get_font_path(name, bold=False):
+    font_paths = load_font_paths()
+    key = f"{name}:{'bold' if bold else 'regular'}"
+    path, set_bold = font_paths.get(key, [None, bold])
+
+    if path and os.path.exists(path):
+        return path, set_bold
+
+    # resolving a system font scans every installed font, so found paths are kept on disk
+    path, set_bold = pygame.font.SysFont(name, 0, bold, constructor=lambda path, size, set_bold, set_italic: [path, set_bold])
+
+    # a font that isn't installed is looked up again next start instead of staying on the default
+    if path:
+        font_paths[key] = [path, set_bold]
+    else:
+        font_paths.pop(key, None)
+    save_font_paths(font_paths)
+
+    return path, set_bold
+
+
+@cache
+def get_font(name, size, bold=False):
+    path, set_bold = get_font_path(name, bold)
+    font = pygame.font.Font(path, size)
+    font.set_bold(set_bold)
+    return font
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def get_cached_text_surface(text, name, size, color, bold):
+    return get_font(name, size, bold).render(text, True, color)
+
+
+def render_text(text, name, size, color, bold=False):
+    return get_cached_text_surface(text, name, size, tuple(color), bold)
+
+
 class SnakeLayoutHandler:
 
-    def __init__(self, game_window):
+    def __init__(self, game_window, dirty_rects=True):
         self.game_window = game_window
+        self.dirty_rects = dirty_rects
         self.window_x, self.window_y = self.game_window.get_size()
         self.game_window.fill((255, 0, 0))
         
@@ -37,6 +101,13 @@ class SnakeLayoutHandler:
         
         self.info_board_pixels = (0, 0, self.window_x, INFO_SURFACE_HEIGHT)
         self.game_board_pixels = (0, self.info_board_pixels[3], self.window_x, self.window_y - INFO_SURFACE_HEIGHT)
+
+        self.changed_rects = []
+        self.changed_info_rects = []
+        self.info_texts = []
+        self.game_changed = True
+        self.head_overlay = None
+        self.drawn_head_overlay = None
     
     
     def get_game_surface_size(self):
@@ -48,28 +119,29 @@ class SnakeLayoutHandler:
 
 
     def set_middle_screen_text(self, text, color):
-        my_font = pygame.font.SysFont(GAME_FONT, MIDDLE_SCREEN_FONT_SIZE)
-        game_over_surface = my_font.render(text, True, color)
+        game_over_surface = render_text(text, GAME_FONT, MIDDLE_SCREEN_FONT_SIZE, color)
         game_over_rect = game_over_surface.get_rect()
         
         game_over_rect.midtop = (self.window_x // 2, self.window_y // 4)
-        self.game_surface.blit(game_over_surface, game_over_rect)
+        self.changed_rects.append(self.game_surface.blit(game_over_surface, game_over_rect))
 
 
     def get_new_text_surface(self, text, size, color):
-        font = pygame.font.SysFont(GAME_FONT, size)
-        surface = font.render(text, True, color)
-        return surface
+        return render_text(text, GAME_FONT, size, color)
 
     
     def add_blocks_game_surface(self, blocks, color, pixel_size):
         for block in blocks:
-            pygame.draw.rect(self.game_surface, color, pygame.Rect(block[0], block[1], pixel_size, pixel_size))
+            self.changed_rects.append(pygame.draw.rect(self.game_surface, color, pygame.Rect(block[0], block[1], pixel_size, pixel_size)))
 
 
     def add_snake_to_game_surface(self, snake, direction, color, pixel_size):
+        self.add_snake_head_to_game_surface(snake[0], direction, color, pixel_size)
+        self.add_blocks_game_surface(snake[1:], color, pixel_size)
+
+
+    def add_snake_head_to_game_surface(self, head, direction, color, pixel_size):
         ## handle snake head and fill out the eyes
-        head = snake[0]
         
         #eye_size = pixel_size // 5
         #eye_dist_l, eye_dist_r = eye_size, pixel_size - (2 * eye_size)
@@ -80,6 +152,7 @@ class SnakeLayoutHandler:
 
         snake_head = self.game_surface.subsurface((head[0], head[1], pixel_size, pixel_size))
         snake_head.fill(color)
+        self.changed_rects.append(pygame.Rect(head[0], head[1], pixel_size, pixel_size))
 
         match direction:
             case pygame.K_RIGHT:
@@ -96,26 +169,83 @@ class SnakeLayoutHandler:
                 pygame.draw.rect(snake_head, SNAKE_RED, (eye_dist_r, eye_dist_l, eye_size, eye_size))
 
 
-        self.add_blocks_game_surface(snake[1:], color, pixel_size)
-
-
     def update_info_surface(self, info_texts):
-        self.info_surface.fill(SNAKE_WHITE)
+        if len(info_texts) != len(self.info_texts):
+            self.info_surface.fill(SNAKE_WHITE)
+            self.info_texts = [None] * len(info_texts)
+
         info_width = self.info_surface_size[0] // len(info_texts)
         for i, info in enumerate(info_texts):
-            xy_loc = (info_width * i, 0)
-            self.info_surface.blit(self.get_new_text_surface(info, SCORE_FONT_SIZE, SNAKE_BLACK), xy_loc)
+            if info == self.info_texts[i]:
+                continue
+
+            info_rect = pygame.Rect(info_width * i, 0, info_width, INFO_SURFACE_HEIGHT)
+            info_field = self.info_surface.subsurface(info_rect)
+            info_field.fill(SNAKE_WHITE)
+            info_field.blit(self.get_new_text_surface(info, SCORE_FONT_SIZE, SNAKE_BLACK), (0, 0))
+
+            self.info_texts[i] = info
+            self.changed_info_rects.append(info_rect)
 
     
     def clear_game_surface(self):
+        self.game_changed = True
         self.game_surface.fill(SNAKE_BLACK)
 
 
+    def fill_outside_board(self, board_width, board_height, color):
+        # a board smaller than the window leaves a margin right of and below it
+        width, height = self.game_surface.get_size()
+        self.game_surface.fill(color, (board_width, 0, width - board_width, height))
+        self.game_surface.fill(color, (0, board_height, width, height - board_height))
+
+
+    def set_head_overlay(self, rect, color):
+        self.head_overlay = (pygame.Rect(rect).clip(self.game_surface.get_rect()), color)
+
+
+    def draw_head_overlay(self):
+        # the overlay is drawn straight onto the window, so the game surface underneath stays intact
+        window_rects = []
+
+        if self.drawn_head_overlay:
+            window_rects.append(self.game_window.blit(self.game_surface, self.drawn_head_overlay.move(0, INFO_SURFACE_HEIGHT), self.drawn_head_overlay))
+            self.drawn_head_overlay = None
+
+        if self.head_overlay:
+            rect, color = self.head_overlay
+            window_rects.append(self.game_window.fill(color, rect.move(0, INFO_SURFACE_HEIGHT)))
+            self.drawn_head_overlay = rect
+            self.head_overlay = None
+
+        return window_rects
+
+
+    def get_changed_window_rects(self):
+        window_rects = [rect.move(0, INFO_SURFACE_HEIGHT) for rect in self.changed_rects]
+
+        for rect, window_rect in zip(self.changed_rects, window_rects):
+            self.game_window.blit(self.game_surface, window_rect, rect)
+
+        for rect in self.changed_info_rects:
+            window_rects.append(self.game_window.blit(self.info_surface, rect, rect))
+
+        return window_rects
+
+
     def update_game_window(self):
-        self.game_window.blit(self.info_surface, self.info_board_pixels)
-        self.game_window.blit(self.game_surface, self.game_board_pixels)
+        if self.dirty_rects and not self.game_changed:
+            pygame.display.update(self.get_changed_window_rects() + self.draw_head_overlay())
+        else:
+            self.game_window.blit(self.info_surface, self.info_board_pixels)
+            self.game_window.blit(self.game_surface, self.game_board_pixels)
+            self.draw_head_overlay()
 
-        pygame.display.update()
+            pygame.display.update()
+
+        self.changed_rects = []
+        self.changed_info_rects = []
+        self.game_changed = False
 
 
 
@@ -125,23 +255,44 @@ class MenuLayoutHandler:
         self.game_window = game_window
         self.menu_items = menu_items
         self.menu_surfaces = []
+        self.menu_index = 0
+        self.changed_items = set()
         self.init_menu_surface()
         self.update_menu_surface()
 
     
-    def draw_menu_surfaces(self):
-        for i, surface in enumerate(self.menu_surfaces):
+    def draw_menu_surfaces(self, indexes):
+        window_rects = []
+
+        for i in indexes:
+            surface = self.menu_surfaces[i]
             x, y = surface.get_size()
-            self.game_window.blit(surface, (0, i * y, x, (i + 1) * y))
+            window_rects.append(self.game_window.blit(surface, (0, i * y, x, y)))
+
+        return window_rects
+
+
+    def draw_menu_selector(self, index, selected):
+        surface = self.menu_surfaces[index]
+        selector_size = surface.get_height() // 5
+        selector = pygame.Rect(0, 0, selector_size, selector_size)
+        selector.center = (surface.get_width() // 10, surface.get_height() // 2)
+        color = SNAKE_ORANGE if selected else surface.get_at((0, 0))
+        pygame.draw.rect(surface, color, selector)
+        self.changed_items.add(index)
 
 
     def move_menu_selector(self, index):
-        for i, surface in enumerate(self.menu_surfaces):
-            selector_size = surface.get_height() // 5
-            selector = pygame.Rect(0, 0, selector_size, selector_size)
-            selector.center = (surface.get_width() // 10, surface.get_height() // 2)
-            color = SNAKE_ORANGE if i == index else surface.get_at((0, 0))
-            pygame.draw.rect(surface, color, selector)
+        if index == self.menu_index:
+            return
+
+        self.draw_menu_selector(self.menu_index, False)
+        self.draw_menu_selector(index, True)
+        self.menu_index = index
+
+
+    def redraw_menu(self):
+        self.changed_items.update(range(len(self.menu_surfaces)))
 
 
     def init_menu_surface(self):
@@ -152,8 +303,7 @@ class MenuLayoutHandler:
             surface = pygame.Surface(menu_surface_size)
             surface.fill((0, 0, random.randint(50, 255)))
 
-            font = pygame.font.SysFont(GAME_FONT, font_size)
-            font_surface = font.render(menu_item, True, SNAKE_ORANGE)
+            font_surface = render_text(menu_item, GAME_FONT, font_size, SNAKE_ORANGE)
             font_rect = font_surface.get_rect()
             
             font_rect.center = (surface.get_width() // 2, surface.get_height() // 2)
@@ -161,21 +311,28 @@ class MenuLayoutHandler:
 
             self.menu_surfaces.append(surface)
         
-        self.move_menu_selector(0)
+        self.draw_menu_selector(self.menu_index, True)
+        self.redraw_menu()
 
 
     def update_menu_surface(self):
-        self.draw_menu_surfaces()
-        pygame.display.update()
+        if not self.changed_items:
+            return
+
+        pygame.display.update(self.draw_menu_surfaces(sorted(self.changed_items)))
+        self.changed_items.clear()
 
 
 
 class GameInterface:
+    QUIT_HOOKS = []
     
     def __init__(self, width, height):
         print("Now starting the game!")
 
-        pygame.init()
+        # the game only needs a window and text, not audio or joysticks
+        pygame.display.init()
+        pygame.font.init()
         pygame.display.set_caption("My Amazing Snake Game")
         self.game_window = pygame.display.set_mode((width, height))
         
@@ -184,9 +341,17 @@ class GameInterface:
         return self.game_window
 
 
-    @staticmethod
-    def quit():
+    @classmethod
+    def add_quit_hook(cls, hook):
+        cls.QUIT_HOOKS.append(hook)
+
+
+    @classmethod
+    def quit(cls):
         print("Now quitting the game!")
+
+        while cls.QUIT_HOOKS:
+            cls.QUIT_HOOKS.pop()()
         
         pygame.quit()
         quit()
@@ -208,8 +373,7 @@ class HighScoreLayoutHandler:
         for i, column in enumerate(columns):
             cell_surface = surface.subsurface(x * i, 0, x, y)
             
-            font = pygame.font.SysFont(GAME_FONT, font_size, bold)
-            font_surface = font.render(str(column), True, SNAKE_BLACK)
+            font_surface = render_text(str(column), GAME_FONT, font_size, SNAKE_BLACK, bold)
             font_rect = font_surface.get_rect()
             font_rect.x = x // offset
             font_rect.y = y // offset
@@ -281,25 +445,31 @@ class PlayerNameLayoutHandler:
             self.add_underscore_to_rect(rect)
 
 
+    def is_blink_hidden(self):
+        return time.time() % 1 > self.BLINK_SPEED
+
+
+    def get_blink_timeout(self):
+        # milliseconds until the current underscore blinks on or off again
+        return int((self.BLINK_SPEED - time.time() % self.BLINK_SPEED) * 1000) + 1
+
+
     def blink_current_underscore(self, player):
         blink_index = len(player)
-        if blink_index < self.name_length and time.time() % 1 > self.BLINK_SPEED:
+        if blink_index < self.name_length and self.is_blink_hidden():
             self.add_underscore_to_rect(self.name_rects[blink_index], SNAKE_BLACK)
 
 
     def update_player_name(self, player):
         for i, char in enumerate(player):
             char_rect = self.name_rects[i]
-            my_font = pygame.font.SysFont(self.INPUT_NAME_FONT, char_rect.height - 10)
-            char_img = my_font.render(char.upper(), True, SNAKE_RED)
+            char_img = render_text(char.upper(), self.INPUT_NAME_FONT, char_rect.height - 10, SNAKE_RED)
             self.game_window.blit(char_img, char_img.get_rect(center = char_rect.center))
         
 
     def add_name_message(self):
         offset_x, offset_y = self.game_window.get_width() // 2, self.game_window.get_height() // self.Y_SPLIT
-        msg_font = pygame.font.SysFont(GAME_FONT, GAME_OVER_FONT_SIZE)
-
-        msg_img = msg_font.render(self.NAME_MSG, True, SNAKE_RED)
+        msg_img = render_text(self.NAME_MSG, GAME_FONT, GAME_OVER_FONT_SIZE, SNAKE_RED)
         msg_rect = msg_img.get_rect()
         msg_rect.midtop = offset_x, offset_y
 
@@ -325,99 +495,98 @@ class InstructionLayoutHandler:
     TEXT_COLOR = SNAKE_BLACK
     FONT_SIZE = 20
     Y_SPLIT = 20
+    EMPTY_LINE = ("", False, False)
+
+    # laid out instructions per (file, width, row height), kept until the file changes
+    INSTRUCTION_SURFACES = {}
 
 
     def __init__(self, game_window):
         self.game_window = game_window
         self.game_window.fill(self.BACKGROUND_COLOR)
-        self.text_surfaces = []
-        self.init_text_surfaces()
+        self.row_height = self.game_window.get_height() // self.Y_SPLIT
+        self.refresh()
 
 
-    def get_empty_surface(self):
-        x, y = self.game_window.get_width(), self.game_window.get_height() // self.Y_SPLIT
-        surface = pygame.Surface((x, y))
-        surface.fill(self.BACKGROUND_COLOR)
-        return surface
+    def refresh(self):
+        self.instructions_surface = self.get_instructions_surface()
+        self.rows = self.instructions_surface.get_height() // self.row_height
 
 
-    def get_centered_text_surface(self, text, bold=False):
-        surface = self.get_empty_surface()
-        text_font = pygame.font.SysFont(GAME_FONT, self.FONT_SIZE, bold)
+    def get_instructions_surface(self):
+        width = self.game_window.get_width()
+        key = (self.GAME_INSTRUCTION_FILE, width, self.row_height)
+        mtime = os.path.getmtime(self.GAME_INSTRUCTION_FILE)
+        cached = self.INSTRUCTION_SURFACES.get(key)
 
-        text_img = text_font.render(text, True, self.TEXT_COLOR)
-        text_rect = text_img.get_rect()
-        text_rect.centerx = surface.get_width() // 2
+        if cached and cached[0] == mtime:
+            return cached[1]
 
-        surface.blit(text_img, text_rect)
+        surface = self.render_lines(self.get_instruction_lines(width), width)
+        self.INSTRUCTION_SURFACES[key] = (mtime, surface)
         return surface
 
 
-    def add_empty_surface(self, index=None):
-        empty_surface = self.get_empty_surface()
-        if index:
-            self.text_surfaces.insert(index, empty_surface)
-        else:
-            self.text_surfaces.append(empty_surface)
-        
-
-    def add_text_line(self, text, bold=False):
-        surface = self.get_empty_surface()
-        my_font = pygame.font.SysFont(GAME_FONT, self.FONT_SIZE, bold)
-        start_w = 0
-        text_to_add = True
+    def wrap_text(self, text, width, bold=False):
+        font = get_font(GAME_FONT, self.FONT_SIZE, bold)
+        lines, line, line_width = [], [], 0
 
         for word in text.split():
-            my_word = my_font.render(f"{word} ", True, (0, 0, 0))
-            text_to_add = True
-
-            if start_w + my_word.get_width() > surface.get_width():
-                start_w = 0
-                self.text_surfaces.append(surface)
-                surface = self.get_empty_surface()
-                text_to_add = False
-            
-            surface.blit(my_word, (start_w, 0))
-            start_w += my_word.get_width()
+            word_width = font.size(f"{word} ")[0]
 
-        if text_to_add:
-            self.text_surfaces.append(surface)
+            if line and line_width + word_width > width:
+                lines.append(" ".join(line))
+                line, line_width = [], 0
 
+            line.append(word)
+            line_width += word_width
 
-    def add_header_footer(self):
-        head_surface = self.get_centered_text_surface(self.HEADER_TEXT, True)
-        foot_surface = self.get_centered_text_surface(self.FOOTER_TEXT, True)
+        if line or not lines:
+            lines.append(" ".join(line))
 
-        self.text_surfaces.insert(0, head_surface)
-        self.add_empty_surface(1)
-        self.text_surfaces.append(foot_surface)
-        self.add_empty_surface()
+        return [(line, bold, False) for line in lines]
 
 
-    def init_text_surfaces(self):
-        tree = ET.parse(self.GAME_INSTRUCTION_FILE)
-        root = tree.getroot()
+    def get_instruction_lines(self, width):
+        root = ET.parse(self.GAME_INSTRUCTION_FILE).getroot()
+        lines = [(self.HEADER_TEXT, True, True), self.EMPTY_LINE]
 
         for section in root.findall("section"):
-            title = section.attrib["name"]
-            instructions = section.find("instruction").text
-            
-            self.add_text_line(title, True)
-            self.add_text_line(instructions)
-            self.add_empty_surface()
+            lines.extend(self.wrap_text(section.attrib["name"], width, True))
+            lines.extend(self.wrap_text(section.find("instruction").text or "", width))
+            lines.append(self.EMPTY_LINE)
 
-        self.add_header_footer()
+        lines.extend([(self.FOOTER_TEXT, True, True), self.EMPTY_LINE])
+        return lines
+
+
+    def render_lines(self, lines, width):
+        surface = pygame.Surface((width, len(lines) * self.row_height))
+        surface.fill(self.BACKGROUND_COLOR)
+
+        for i, (text, bold, centered) in enumerate(lines):
+            if not text:
+                continue
+
+            text_img = get_font(GAME_FONT, self.FONT_SIZE, bold).render(text, True, self.TEXT_COLOR)
+            text_rect = text_img.get_rect(top=i * self.row_height)
+            if centered:
+                text_rect.centerx = width // 2
+
+            surface.blit(text_img, text_rect, (0, 0, text_rect.width, self.row_height))
+
+        return surface
 
 
     def update_view(self, start_index):
-        if start_index >= len(self.text_surfaces):
+        if start_index >= self.rows:
             return
-        
-        view_surfaces = self.text_surfaces[start_index:start_index + self.Y_SPLIT]
 
-        for i, surface in enumerate(view_surfaces):
-            self.game_window.blit(surface, (0, i * surface.get_height()))
+        top = start_index * self.row_height
+        view_height = min(self.game_window.get_height(), self.instructions_surface.get_height() - top)
+        view = self.instructions_surface.subsurface((0, top, self.instructions_surface.get_width(), view_height))
+
+        self.game_window.blit(view, (0, 0))
+        self.game_window.fill(self.BACKGROUND_COLOR, (0, view_height, self.game_window.get_width(), self.game_window.get_height() - view_height))
         
         pygame.display.update()
-
-
@@ -0,0 +1,175 @@
+import os
+from game_engine import *
+from agents import Agent
+
+
+REPLAY_MAGIC = b"SNKR"
+REPLAY_VERSION = 1
+REPLAY_DIRECTORY = "replays"
+REPLAY_EXTENSION = ".snkr"
+PAUSE_EVENT = len(VALID_KEYS)
+
+
+def write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    buffer.append(value)
+
+
+def read_varint(data, offset):
+    value, shift = 0, 0
+
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+
+        if byte < 0x80:
+            return value, offset
+
+
+
+class Replay:
+
+    def __init__(self, mode, board_size, seed, events=None, end_tick=0):
+        self.mode = mode
+        self.board_size = tuple(board_size)
+        self.seed = seed
+        self.events = events or []
+        self.end_tick = end_tick
+        self.last_direction = START_DIRECTION
+
+
+    def record_direction(self, tick, direction):
+        if direction == self.last_direction or direction not in VALID_KEYS:
+            return
+
+        self.last_direction = direction
+        self.events.append((tick, VALID_KEYS.index(direction)))
+
+
+    def record_pause(self, tick):
+        self.events.append((tick, PAUSE_EVENT))
+
+
+    def get_directions(self):
+        return [(tick, VALID_KEYS[event]) for tick, event in self.events if event != PAUSE_EVENT]
+
+
+    def to_bytes(self):
+        mode = self.mode.encode()
+        buffer = bytearray(REPLAY_MAGIC)
+        buffer.append(REPLAY_VERSION)
+
+        write_varint(buffer, len(mode))
+        buffer.extend(mode)
+
+        for value in (*self.board_size, self.seed, self.end_tick, len(self.events)):
+            write_varint(buffer, value)
+
+        last_tick = 0
+        for tick, event in self.events:
+            write_varint(buffer, tick - last_tick)
+            buffer.append(event)
+            last_tick = tick
+
+        return bytes(buffer)
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(REPLAY_MAGIC) + 1] != REPLAY_MAGIC + bytes([REPLAY_VERSION]):
+            raise ValueError("Not a supported snake replay")
+
+        try:
+            return cls.read_fields(data)
+        except IndexError:
+            raise ValueError("Truncated snake replay") from None
+
+
+    @classmethod
+    def read_fields(cls, data):
+
+        offset = len(REPLAY_MAGIC) + 1
+        mode_length, offset = read_varint(data, offset)
+        mode = data[offset:offset + mode_length].decode()
+        offset += mode_length
+
+        values = []
+        for _ in range(5):
+            value, offset = read_varint(data, offset)
+            values.append(value)
+        board_x, board_y, seed, end_tick, num_events = values
+
+        events, tick = [], 0
+        for _ in range(num_events):
+            tick_delta, offset = read_varint(data, offset)
+            tick += tick_delta
+            if data[offset] > PAUSE_EVENT:
+                raise ValueError("Corrupt snake replay")
+            events.append((tick, data[offset]))
+            offset += 1
+
+        return cls(mode, (board_x, board_y), seed, events, end_tick)
+
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            data = file.read()
+
+        try:
+            return cls.from_bytes(data)
+        except ValueError as error:
+            raise ValueError(f"{path}: {error}") from None
+
+
+
+class ReplayAgent(Agent):
+    NAME = "Replay"
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.reset()
+
+
+    def reset(self, seed=None):
+        self.directions = self.replay.get_directions()
+        self.next_direction = 0
+        self.change_to = START_DIRECTION
+
+
+    def get_action(self, observation):
+        while self.next_direction < len(self.directions) and self.directions[self.next_direction][0] <= observation.ticks:
+            self.change_to = self.directions[self.next_direction][1]
+            self.next_direction += 1
+
+        return self.change_to
+
+
+    def is_finished(self, ticks):
+        return ticks >= self.replay.end_tick
+
+
+
+def get_replay_path(mode, stop_time):
+    os.makedirs(REPLAY_DIRECTORY, exist_ok=True)
+    return os.path.join(REPLAY_DIRECTORY, f"{mode}_{int(stop_time * 1000)}{REPLAY_EXTENSION}")
+
+
+def play_replay(replay):
+    engine = GAME_ENGINES[replay.mode](replay.board_size, replay.seed)
+    agent = ReplayAgent(replay)
+
+    while engine.ticks < replay.end_tick and engine.step(agent.get_action(engine.get_observation())):
+        pass
+
+    return engine
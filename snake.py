@@ -1,17 +1,170 @@
-from db_handlers import DatabaseHandler
-from layout_handlers import GameInterface
-from input_handlers import MainMenuInputHandler
+import time
+STARTUP_TIME = time.perf_counter()
 
+import argparse
+from game_engine import GAME_ENGINES, DEFAULT_BOARD_SIZE, MIN_BOARD_SIZE, is_valid_board_size, run_headless_games
+from agents import AGENTS
+from replays import Replay, ReplayAgent, play_replay
+
+
+class StartupTimer:
+
+    def __init__(self, start_time):
+        self.start_time = self.last_time = start_time
+        self.phases = []
+
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last_time))
+        self.last_time = now
+
+
+    def print_report(self):
+        for phase, duration in self.phases:
+            print(f"{phase:<20}{duration * 1000:8.1f} ms")
+
+        print(f"{'first menu frame':<20}{(self.last_time - self.start_time) * 1000:8.1f} ms after start")
+
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="A classic game of snake.")
+    parser.add_argument("--headless", action="store_true", help="simulate games without opening a window")
+    parser.add_argument("--mode", choices=list(GAME_ENGINES), default="Standard", help="game mode to simulate")
+    parser.add_argument("--games", type=int, default=1, help="number of games to simulate")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the first simulated game")
+    parser.add_argument("--board", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="board size in cells, bigger boards scroll with the snake")
+    parser.add_argument("--agent", choices=list(AGENTS), default="Random", help="agent playing the simulated games")
+    parser.add_argument("--batch", type=int, default=0, help="simulate this many games in lockstep with NumPy")
+    parser.add_argument("--replay", nargs="+", default=[], help="replay files to re-simulate")
+    parser.add_argument("--render", action="store_true", help="show the replays in a window")
+    parser.add_argument("--speed", type=float, default=1, help="playback speed factor of rendered replays")
+    parser.add_argument("--profile", nargs="?", const="", default=None, metavar="PATH", help="time every frame phase and report percentiles after each game, appended as JSON lines to PATH if given")
+    parser.add_argument("--interpolate", action="store_true", help="slide the snake's head between cells at the display rate")
+    parser.add_argument("--hud", action="store_true", help="show the 95th percentile frame time in the info bar")
+    parser.add_argument("--startup-report", action="store_true", help="print how long each startup step took until the main menu was shown")
+    parser.add_argument("--export-scores", metavar="PATH", help="write the score database to a .csv or .jsonl file")
+    parser.add_argument("--import-scores", metavar="PATH", nargs="+", default=[], help="merge .csv or .jsonl score files into the database")
+    parser.add_argument("--dedupe", action="store_true", help="skip imported scores that are already in the database")
+    args = parser.parse_args()
+
+    if args.board and not is_valid_board_size(args.board):
+        parser.error(f"--board must be at least {MIN_BOARD_SIZE[0]} {MIN_BOARD_SIZE[1]} to fit the starting snake")
+
+    return args
+
+
+def get_board_size(args):
+    return tuple(args.board) if args.board else DEFAULT_BOARD_SIZE
+
+
+def run_headless(args):
+    start_time = time.perf_counter()
+
+    if args.batch:
+        from batch_engine import run_batch_games
+        results = run_batch_games(args.mode, args.games, args.batch, args.seed, get_board_size(args))
+    else:
+        results = run_headless_games(args.mode, args.games, AGENTS[args.agent](), args.seed, get_board_size(args))
+
+    run_time = time.perf_counter() - start_time
+
+    scores = [score for _, score, *_ in results]
+    print(f"{args.games} {args.mode} games in {run_time:.2f} s ({args.games / run_time:.1f} games/s)")
+    print(f"Score max: {max(scores)}, mean: {sum(scores) / len(scores):.2f}")
+
+
+def get_frame_profiler(args):
+    if args.profile is None and not args.hud:
+        return None
+
+    from frame_profiler import FrameProfiler
+    return FrameProfiler(report_path=args.profile or None, hud=args.hud, report=args.profile is not None)
+
+
+def get_game_options(args):
+    return {"profiler": get_frame_profiler(args), "interpolate": args.interpolate, "board_size": tuple(args.board) if args.board else None}
+
+
+def run_replays(args):
+    start_time = time.perf_counter()
+    ticks = 0
+
+    for path in args.replay:
+        engine = play_replay(Replay.load(path))
+        ticks += engine.ticks
+        print(f"{path}: {engine.GAME_MODE} score {engine.score} after {engine.ticks} ticks")
+
+    run_time = time.perf_counter() - start_time
+    print(f"{len(args.replay)} replays, {ticks} ticks in {run_time:.2f} s ({ticks / run_time:.0f} ticks/s)")
+
+
+def render_replays(args):
+    from layout_handlers import GameInterface, PIXEL_SIZE, INFO_SURFACE_HEIGHT
+    from game_modes import GAME_MODES
+
+    game_options = get_game_options(args)
+
+    for path in args.replay:
+        replay = Replay.load(path)
+        game_options["board_size"] = replay.board_size
+        view_x, view_y = (min(board, view) for board, view in zip(replay.board_size, DEFAULT_BOARD_SIZE))
+        game_interface = GameInterface(view_x * PIXEL_SIZE, view_y * PIXEL_SIZE + INFO_SURFACE_HEIGHT)
+        game_mode = GAME_MODES[replay.mode](game_interface.get_game_window(), replay.seed, **game_options)
+        game_mode.run_game(ReplayAgent(replay), args.speed, record_replay=False)
+
+    GameInterface.quit()
+
+
+def transfer_scores(args):
+    from db_handlers import DatabaseHandler
 
-if __name__ == "__main__":
-    window_size = (720, 480)
-    
     dbHandler = DatabaseHandler()
-    game_interface = GameInterface(*window_size)
-    game_window = game_interface.get_game_window()
 
-    mainMenu = MainMenuInputHandler(game_window, dbHandler)
+    for path in args.import_scores:
+        print(f"{path}: {dbHandler.import_scores(path, args.dedupe)} scores imported")
+
+    if args.export_scores:
+        print(f"{args.export_scores}: {dbHandler.export_scores(args.export_scores)} scores exported")
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if args.import_scores or args.export_scores:
+        transfer_scores(args)
+    elif args.replay and args.render:
+        render_replays(args)
+    elif args.replay:
+        run_replays(args)
+    elif args.headless:
+        run_headless(args)
+    else:
+        startup_timer = StartupTimer(STARTUP_TIME)
+
+        from db_handlers import DatabaseHandler
+        from layout_handlers import GameInterface
+        from input_handlers import MainMenuInputHandler
+        startup_timer.mark("imports")
+
+        window_size = (720, 480)
+
+        dbHandler = DatabaseHandler(write_behind=True)
+        GameInterface.add_quit_hook(dbHandler.close)
+        startup_timer.mark("database")
+
+        game_interface = GameInterface(*window_size)
+        game_window = game_interface.get_game_window()
+        startup_timer.mark("window")
+
+        mainMenu = MainMenuInputHandler(game_window, dbHandler, get_game_options(args))
+
+        def on_first_frame():
+            startup_timer.mark("main menu")
+            if args.startup_report:
+                startup_timer.print_report()
 
-    mainMenu.run()
+        mainMenu.run(on_first_frame)
 
-    game_interface.quit()
+        game_interface.quit()
@@ -0,0 +1,124 @@
+import argparse
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from game_engine import *
+from agents import AGENTS
+
+
+TOURNAMENT_CHUNK_SIZE = 50
+
+
+def play_tournament_games(agent_name, mode, seeds, board_size=DEFAULT_BOARD_SIZE):
+    engine = GAME_ENGINES[mode](board_size, seeds[0])
+    agent = AGENTS[agent_name]()
+    results = []
+
+    for i, seed in enumerate(seeds):
+        if i:
+            engine.seed = seed
+            engine.reset()
+
+        _, score, play_time, _ = play_headless_game(engine, agent)
+        results.append((agent_name, mode, seed, score, play_time, engine.ticks, engine.picked_apples))
+
+    return results
+
+
+def run_tournament(agent_names, modes, seeds, workers=None, chunk_size=TOURNAMENT_CHUNK_SIZE):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(play_tournament_games, agent_name, mode, seeds[i:i + chunk_size])
+            for agent_name in agent_names for mode in modes for i in range(0, len(seeds), chunk_size)
+        ]
+
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def get_percentile(sorted_values, percent):
+    return sorted_values[min(len(sorted_values) - 1, len(sorted_values) * percent // 100)]
+
+
+
+class TournamentStats:
+    COLUMNS = ["AGENT", "MODE", "GAMES", "MEAN SCORE", "P50", "P95", "MAX", "MEAN TIME (s)", "MEAN APPLES"]
+
+    def __init__(self):
+        self.results = defaultdict(list)
+
+
+    def add_results(self, results):
+        for agent_name, mode, seed, score, play_time, ticks, apples in results:
+            self.results[(agent_name, mode)].append((score, play_time, apples))
+
+
+    def get_games_played(self):
+        return sum(len(results) for results in self.results.values())
+
+
+    def get_summary(self):
+        summary = []
+
+        for (agent_name, mode), results in sorted(self.results.items()):
+            scores = sorted(score for score, *_ in results)
+            games = len(results)
+            summary.append([
+                agent_name,
+                mode,
+                games,
+                f"{sum(scores) / games:.2f}",
+                get_percentile(scores, 50),
+                get_percentile(scores, 95),
+                scores[-1],
+                f"{sum(play_time for _, play_time, _ in results) / games:.2f}",
+                f"{sum(apples for *_, apples in results) / games:.2f}",
+            ])
+
+        return summary
+
+
+    def print_summary(self):
+        rows = [self.COLUMNS] + [[str(column) for column in row] for row in self.get_summary()]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(self.COLUMNS))]
+
+        for row in rows:
+            print("  ".join(column.rjust(width) for column, width in zip(row, widths)))
+
+
+
+def save_tournament_results(dbHandler, results, date):
+    dbHandler.set_scores([(agent_name, mode, score, play_time, date) for agent_name, mode, _, score, play_time, *_ in results])
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Play agents against every game mode over a process pool.")
+    parser.add_argument("--agents", nargs="+", choices=list(AGENTS), default=list(AGENTS), help="agents taking part")
+    parser.add_argument("--modes", nargs="+", choices=list(GAME_ENGINES), default=list(GAME_ENGINES), help="game modes to play")
+    parser.add_argument("--games", type=int, default=100, help="games per agent and mode")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the first game of every agent and mode")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--save", action="store_true", help="store every game in the score database")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    seeds = list(range(args.seed, args.seed + args.games))
+    stats = TournamentStats()
+    all_results = []
+    start_time = time.perf_counter()
+
+    for results in run_tournament(args.agents, args.modes, seeds, args.workers):
+        stats.add_results(results)
+        all_results.extend(results)
+        print(f"\r{stats.get_games_played()} games played", end="", flush=True)
+
+    run_time = time.perf_counter() - start_time
+    print(f"\r{stats.get_games_played()} games in {run_time:.2f} s on {args.workers} workers")
+    stats.print_summary()
+
+    if args.save:
+        from db_handlers import DatabaseHandler
+        save_tournament_results(DatabaseHandler(), all_results, time.time())